@@ -24,8 +24,12 @@
 #include <boost/fusion/container/map.hpp>
 #include <boost/log/trivial.hpp>
 
+#include <algorithm>
 #include <atomic>
+#include <condition_variable>
+#include <functional>
 #include <memory>
+#include <mutex>
 #include <numeric>
 #include <set>
 #include <thread>
@@ -77,6 +81,40 @@ namespace uDAQ {
       if(type.compare("=") == 0 && value == threshold) triggeredEvents.at(event)++;
     }
 
+    /**
+     * Test the trigger criteria for the data of one event.
+     * \param y The data of the trigger variable. For scalars the vector has length 1.
+     * \param event The event number.
+     */
+    void testTrace(const std::vector<double>& y, const Long64_t& event) {
+      if(arrayPosition >= 0) {
+        testValue(y.at(arrayPosition), event);
+      }
+      else if(arrayPosition == -1) {
+        if(y.size() > 0) {
+          testValue(std::accumulate(y.begin(), y.end(), 0.0) / y.size(), event);
+        }
+        else {
+          BOOST_LOG_TRIVIAL(error) << "Array size is 0 in trigger decision calculation." << std::endl;
+        }
+      }
+      else if(arrayPosition == -2) {
+        testValue(*std::max_element(y.begin(), y.end()), event);
+      }
+      else if(arrayPosition == -3) {
+        testValue(*std::min_element(y.begin(), y.end()), event);
+      }
+      else if(arrayPosition == -4) {
+        for(size_t index = 0; index < y.size(); index++) {
+          testValue(y.at(index), event);
+        }
+      }
+      else {
+        throw std::runtime_error(std::string("Unknown array position given: ") + std::to_string(arrayPosition) +
+            ". Allowed values are >0, -1 (mean), -2 (max), -3 (min), -4 (any)");
+      }
+    }
+
     size_t getNTrigger() { return std::accumulate(triggeredEvents.begin(), triggeredEvents.end(), 0); }
   };
 
@@ -119,7 +157,8 @@ namespace uDAQ {
 
   namespace detail {
     struct UpdateData;
-  }
+    struct FileReader;
+  } // namespace detail
 
   class DataHandler {
    protected:
@@ -132,6 +171,10 @@ namespace uDAQ {
     std::atomic<bool> m_done;
     std::atomic<bool> m_interrupt;
     std::atomic<double> m_percentage; ///< During time line data processing here the processing in percent is stored
+    std::atomic<size_t> m_filled;     ///< Number of leading events of the time lines that are already filled
+    std::mutex m_timeLinesMutex; ///< Locked while filled events are moved or the time lines are replaced
+    std::mutex m_doneMutex;                   ///< Mutex used together with m_doneCondition
+    std::condition_variable m_doneCondition; ///< Notified when m_done is set (see waitDone)
 
     Long_t m_start;
     Long_t m_end;
@@ -139,18 +182,43 @@ namespace uDAQ {
     int m_arrayPosition;
     TimeAxis m_timeAxis;
 
+    size_t m_nThreads; ///< Number of threads used in the event loops. If > 1 files are processed in parallel
+
     void reset() {
       m_done = false;
       m_interrupt = false;
       m_percentage = 0.0;
+      m_filled = 0;
     }
 
+    /**
+     * Mark the current task as done and wake up threads waiting in waitDone().
+     */
+    void setDone() {
+      {
+        std::lock_guard<std::mutex> lock(m_doneMutex);
+        m_done = true;
+      }
+      m_doneCondition.notify_all();
+    }
+
+    /**
+     * Call processFile for every file in the chain using m_nThreads threads.
+     * Files are distributed dynamically over the threads. No new file is started after m_interrupt was set.
+     *
+     * \param processFile Function called with the index of the file in the chain. It is called concurrently for
+     * different files.
+     */
+    void runParallel(const std::function<void(const size_t&)>& processFile);
+
     /* @} */
 
     TChain* m_chain;                            ///< Chain holding all events
     std::string m_treeName;                     ///< Name of the data TTree
     std::vector<std::string> m_branches;        ///< vector of branch names found in the tree
     Int_t m_nTrees;                             ///< Number of trees in the chain (equal to the number of files)
+    std::vector<std::string> m_fileNames;       ///< Names of the files in the chain
+    std::vector<Long64_t> m_treeOffsets; ///< First event of each file in the chain. The last entry is m_nEntries
     Long64_t m_nEntries;                        ///< Number of all entries in the chain
     std::unique_ptr<triggerData> m_lastTrigger; ///< <<ProcessVariable, triggerType> , triggered Events>
     std::unique_ptr<triggerData> m_trigger;     ///< <<ProcessVariable, triggerType> , triggered Events>
@@ -191,6 +259,17 @@ namespace uDAQ {
      */
     void collectData();
 
+    /**
+     * Parallel version of the event loop of collectData. Every file is opened separately and processed by one of
+     * m_nThreads threads. All traces are created before and the threads fill disjoint parts of the traces.
+     * Events that can not be read are removed afterwards, so the result is the same as for the serial event loop.
+     * If a file can not be opened or processing it fails, its remaining events are removed as well.
+     *
+     * \param nMax The length of the time lines.
+     * \return The number of events that were filled without gap, starting from the first event.
+     */
+    size_t collectDataParallel(const size_t& nMax);
+
     /**
      * This is the trigger search function that is executed in a separate thread.
      * It loops over all events and test if they fulfill the trigger criteria (stored in m_trigger).
@@ -198,6 +277,11 @@ namespace uDAQ {
      */
     void getTriggerDecision();
 
+    /**
+     * Parallel version of the complete trigger search in getTriggerDecision (see runParallel).
+     */
+    void getTriggerDecisionParallel();
+
     /**
      * Check if the given file matches one of the strings in matchStrings.
      *
@@ -386,6 +470,15 @@ namespace uDAQ {
 
     static void setLogLevel(int LogLevel);
 
+    /**
+     * Set the number of threads used when reading time lines and when doing a complete trigger search.
+     * If more than one thread is used the files in the chain are processed in parallel.
+     * The simple trigger search is always done using a single thread.
+     *
+     * \param nThreads The number of threads. Values < 2 disable the parallel processing.
+     */
+    void setNThreads(const size_t& nThreads);
+
     /**
      * \return The number of TTrees in the internal TChain.
      * This number corresponds to the number of handled files.
@@ -424,6 +517,13 @@ namespace uDAQ {
      */
     virtual void readTimeStamp(const Long_t& event);
 
+    /**
+     * Read the time stamps of all events in the chain.
+     * Only the time information branch is read.
+     * \return Vector of seconds since EPOCH for every event. Events that could not be read are set to NaN.
+     */
+    std::vector<double> readTimeStamps();
+
     /**
      * Return the time stamp for a given event.
      * This requires to open the file once and read one event.
@@ -442,8 +542,31 @@ namespace uDAQ {
      */
     void stop() { m_interrupt = true; }
     std::pair<bool, double> isDone();
+
+    /**
+     * Block until the current task is done or the timeout is reached. The calling thread is woken up as soon as
+     * the task is finished, so it can be used instead of polling isDone(). Calling it repeatedly with a short
+     * timeout allows to report the progress (m_percentage) in between.
+     *
+     * \param timeout Maximum time to wait in milliseconds.
+     * \return True if the task is done. Call isDone() afterwards to join the worker thread.
+     */
+    bool waitDone(const size_t& timeout);
+
+    /**
+     * Get the number of leading events of the time lines that are already filled.
+     * This can be used to show the time lines while they are still collected (see getFilledTimeLines).
+     */
+    size_t getNFilled() { return m_filled; }
+
+    /**
+     * Copy the first getNFilled() entries of all time lines. In contrast to reading timeLines directly this is safe
+     * while the time lines are collected, since filled events are only moved while holding the same lock.
+     */
+    std::map<std::string, Trace> getFilledTimeLines();
     /* @} */
 
     friend struct uDAQ::detail::UpdateData;
+    friend struct uDAQ::detail::FileReader;
   };
 } // namespace uDAQ
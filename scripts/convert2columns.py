@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+'''
+Convert MicroDAQ HDF5 files to a memory mappable column store.
+Each variable is stored as a contiguous numpy array (see chimeratk_daq.ColumnStore.convert).
+The store can be used by the MicroDAQviewer via --columnStore.
+'''
+import argparse
+import glob
+import logging
+import os
+
+from chimeratk_daq.ColumnStore import convert
+from chimeratk_daq.EventIndex import EventIndex
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Convert MicroDAQ HDF5 files to a column store',
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-p' ,'--path', type=str, required=True,
+                      help='path were the MicroDAQ files are located')
+  parser.add_argument('-o' ,'--output', type=str, required=True,
+                      help='output directory of the column store')
+  parser.add_argument('-m','--matchString', type=str, default='',
+                      help='Only files including the given string in their name will be considered.')
+  parser.add_argument('-i','--items', type=str, nargs='+', default=None,
+                      help='Variables to be converted, e.g. /Probe/amp. By default all variables are converted.')
+  parser.add_argument('--debug', action='store_true',
+                      help='enable debug output')
+  args = parser.parse_args()
+  logging.basicConfig(format='[%(levelname)s]: %(message)s', level=logging.DEBUG if args.debug else logging.INFO)
+
+  filenames = glob.glob(os.path.join(args.path, "*" + args.matchString + "*.h5"))
+  if len(filenames) == 0:
+    logging.error("No DAQ files found..")
+    exit(1)
+  # store events in time order
+  index = EventIndex(os.path.abspath(args.path))
+  filenames.sort(key=index.getFirstEvent)
+  index.save()
+  try:
+    convert(filenames, args.output, args.items)
+  except ValueError as e:
+    logging.error(str(e))
+    exit(1)
@@ -9,9 +9,11 @@
 
 #include "DataHandler.h"
 
+#include "TChainElement.h"
 #include "TFile.h"
 #include "TLeafObject.h"
 #include "TMath.h"
+#include "TROOT.h"
 #include "TTree.h"
 #include "TTreeReader.h"
 
@@ -22,6 +24,8 @@
 #include <boost/log/expressions.hpp>
 
 #include <algorithm>
+#include <chrono>
+#include <limits>
 #include <numeric>
 #include <sstream>
 #include <string>
@@ -33,8 +37,8 @@ using namespace std;
 namespace uDAQ {
   DataHandler::DataHandler(const std::string& folder, const bool& sort, const std::vector<std::string>& matchString,
       const size_t& maxFiles, const std::string& treeName)
-  : m_decimation(1), m_treeName(treeName), m_lastTrigger(nullptr), m_localEntry(0), m_newFile(false), m_tinfo(nullptr),
-    m_timeStamp(nullptr) {
+  : m_decimation(1), m_timeAxis(TimeAxis::TRUE), m_nThreads(1), m_treeName(treeName), m_lastTrigger(nullptr),
+    m_localEntry(0), m_newFile(false), m_tinfo(nullptr), m_timeStamp(nullptr) {
     boost::filesystem::path p(folder);
     if(!boost::filesystem::is_directory(p)) throw std::runtime_error("The given folder string is not a directory");
     BOOST_LOG_TRIVIAL(info) << "\t Using matching strings: " << endl;
@@ -110,6 +114,22 @@ namespace uDAQ {
     BOOST_LOG_TRIVIAL(debug) << "Reading number of events..." << endl;
     m_nEntries = m_chain->GetEntries();
     BOOST_LOG_TRIVIAL(info) << "Number of events is: " << m_nEntries << endl;
+    // file names and event offsets are used by the parallel event loops
+    // the chain only knows the offsets of the trees loaded so far -> load every tree once
+    for(Long64_t entry = 0; entry < m_nEntries;) {
+      if(m_chain->LoadTree(entry) < 0) {
+        BOOST_LOG_TRIVIAL(error) << "Failed to load the tree of event " << entry << "." << endl;
+        break;
+      }
+      entry = m_chain->GetTreeOffset()[m_chain->GetTreeNumber()] + m_chain->GetTree()->GetEntries();
+    }
+    auto fileElements = m_chain->GetListOfFiles();
+    for(Int_t i = 0; i < fileElements->GetEntries(); i++) {
+      m_fileNames.push_back(((TChainElement*)fileElements->At(i))->GetTitle());
+      // trailing empty trees are not loaded
+      m_treeOffsets.push_back(std::min(m_chain->GetTreeOffset()[i], m_nEntries));
+    }
+    m_treeOffsets.push_back(m_nEntries);
     //  m_chain->SetBranchStatus("*", 0);
     //  m_chain->SetBranchStatus("timeInfo", 1);
     m_chain->LoadTree(0);
@@ -226,6 +246,45 @@ namespace uDAQ {
       }
     };
 
+    /**
+     * Calculate the value put into a time line from the data of one event.
+     * \param helper The chainHelper holding the data read for the event.
+     * \param arrayPosition The array position to be used. If it is -1 the average of the array is
+     * considered. If it is -2 the maximum is considered. If it is -3 the minimum is considered.
+     */
+    template<typename T>
+    Double_t reduceArray(const chainHelper<T>& helper, const int& arrayPosition) {
+      if(arrayPosition == -1) {
+        return helper.arr.GetSum() / helper.arr.GetSize();
+      }
+      else if(arrayPosition == -2) {
+        return TMath::MaxElement(helper.arr.GetSize(), helper.arr.GetArray());
+      }
+      else if(arrayPosition == -3) {
+        return TMath::MinElement(helper.arr.GetSize(), helper.arr.GetArray());
+      }
+      else if(arrayPosition >= 0) {
+        if(!helper.isTrace) {
+          return helper.arr.At(0);
+        }
+        else if(helper.arr.GetSize() - 1 >= arrayPosition) {
+          return helper.arr.At(arrayPosition);
+        }
+        else {
+          // do not throw here since it can not be catched so far and it might happen regularly
+          //            throw std::runtime_error(std::string("Requested array position is too large. Maximum is
+          //            :")+std::to_string(it->second.arr.GetSize()-1));
+          BOOST_LOG_TRIVIAL(warning) << "Requested array position is too large. Will use maximum instead: "
+                                     << helper.arr.GetSize() - 1 << endl;
+          return helper.arr.At(helper.arr.GetSize() - 1);
+        }
+      }
+      else {
+        // throwing here is ok since it should not happen -> this is guaranteed by the API usage of the python program
+        throw std::runtime_error("Wrong array index using for update. Should be > -4.");
+      }
+    }
+
     struct UpdateData {
       /**
        * Read data from the file and copy the data to the timeLines.
@@ -236,13 +295,15 @@ namespace uDAQ {
        * with nMax-1 \param eventID The event number in the TTree/TChain. It is used for the x vector of the Trace. If
        * eventID<0 it is assumed that only a single event is read. In that case the timeLine is actually the array read
        * for this event. The x vector is filled with the array index.
+       * \param ok If not nullptr it is set to false if reading one of the branches failed.
        */
-      UpdateData(DataHandler* caller, size_t nMax, size_t event, int eventID = -1)
-      : _caller(caller), _nMax(nMax), _event(event), _eventID(eventID) {}
+      UpdateData(DataHandler* caller, size_t nMax, size_t event, int eventID = -1, bool* ok = nullptr)
+      : _caller(caller), _nMax(nMax), _event(event), _eventID(eventID), _ok(ok) {}
       DataHandler* _caller;
       size_t _nMax;  //<<< Expected length of the timeline to be filled here
       size_t _event; //<<< The event that is currently filled
       int _eventID;  //<<< The ID of the event. If -1 a single event is read!
+      bool* _ok;     //<<< Set to false if reading failed
       template<typename PAIR>
       void operator()(PAIR&) const {
         typedef typename PAIR::first_type UserType;
@@ -264,6 +325,7 @@ namespace uDAQ {
           if(it->second.branch->GetEntry(_caller->m_localEntry) <= 0) {
             BOOST_LOG_TRIVIAL(error) << "Failed reading data for event: " << _event
                                      << " at local event: " << _caller->m_localEntry << ")." << endl;
+            if(_ok) *_ok = false;
             continue;
           }
           // Create Trace if not yet done
@@ -287,35 +349,7 @@ namespace uDAQ {
             }
           }
           else {
-            if(_caller->m_arrayPosition == -1) {
-              currentTrace->y.at(_event) = it->second.arr.GetSum() / it->second.arr.GetSize();
-            }
-            else if(_caller->m_arrayPosition == -2) {
-              currentTrace->y.at(_event) = TMath::MaxElement(it->second.arr.GetSize(), &it->second.arr[0]);
-            }
-            else if(_caller->m_arrayPosition == -3) {
-              currentTrace->y.at(_event) = TMath::MinElement(it->second.arr.GetSize(), &it->second.arr[0]);
-            }
-            else if(_caller->m_arrayPosition >= 0) {
-              if(!it->second.isTrace) {
-                currentTrace->y.at(_event) = it->second.arr.At(0);
-              }
-              else if(it->second.arr.GetSize() - 1 >= _caller->m_arrayPosition) {
-                currentTrace->y.at(_event) = it->second.arr.At(_caller->m_arrayPosition);
-              }
-              else {
-                // do not throw here since it can not be catched so far and it might happen regularly
-                //            throw std::runtime_error(std::string("Requested array position is too large. Maximum is
-                //            :")+std::to_string(it->second.arr.GetSize()-1));
-                BOOST_LOG_TRIVIAL(warning) << "Requested array position is too large. Will use maximum instead: "
-                                           << it->second.arr.GetSize() - 1 << endl;
-                currentTrace->y.at(_event) = it->second.arr.At(it->second.arr.GetSize() - 1);
-              }
-            }
-            else {
-              // throwing here is ok since it should not happen -> this is guaranteed by the API usage of the python program
-              throw std::runtime_error("Wrong array index using for update. Should be > -4.");
-            }
+            currentTrace->y.at(_event) = reduceArray(it->second, _caller->m_arrayPosition);
             if(_caller->m_timeAxis == TimeAxis::TRUE ||
                 (_caller->m_timeAxis == TimeAxis::AUTO && !it->second.isTrace)) {
               if(_caller->m_tinfo == nullptr) {
@@ -334,6 +368,209 @@ namespace uDAQ {
         }
       }
     };
+
+    /**
+     * Reader for a single file of the chain used in the parallel event loops.
+     * Every thread opens its own copy of the file and sets up its own branches for the process variables
+     * activated in the DataHandler (see DataHandler::prepareReading).
+     */
+    struct FileReader {
+      FileReader(DataHandler* caller, const size_t& iFile);
+      ~FileReader();
+
+      /**
+       * Read the active branches and the time information.
+       * \param localEntry The event number in the file.
+       * \return False if reading one of the branches failed.
+       */
+      bool readEvent(const Long64_t& localEntry);
+
+      /**
+       * Fill the data read by readEvent into the time lines of the DataHandler.
+       * \param event The position in the time lines to be filled.
+       * \param eventID The event number in the chain.
+       * \param valid If false nan is filled for the data.
+       */
+      void fillTimeLines(const size_t& event, const Long64_t& eventID, const bool& valid);
+
+      /**
+       * \return The data read by readEvent for the first active process variable.
+       */
+      std::vector<double> getValues();
+
+      /**
+       * \return The time stamp of the event read by readEvent in seconds since EPOCH.
+       */
+      double getTime();
+
+      DataHandler* _caller;
+      int _arrayPosition;
+      TimeAxis _timeAxis;
+      std::unique_ptr<TFile> _file;
+      TTree* _tree;
+      TemplateUserTypeMap<DataHandler::DataList> _data;
+      TTimeStamp* _timeStamp;
+      hdf5converter::timeInfo_t* _tinfo;
+      TBranch* _timeBranch;
+    };
+
+    struct SetupReader {
+      SetupReader(FileReader* reader) : _reader(reader){};
+      FileReader* _reader;
+      template<typename PAIR>
+      void operator()(PAIR&) const {
+        typedef typename PAIR::first_type UserType;
+        auto& dataMap = boost::fusion::at_key<UserType>(_reader->_caller->data.table);
+        auto& readerMap = boost::fusion::at_key<UserType>(_reader->_data.table);
+        for(auto it = dataMap.begin(); it != dataMap.end(); it++) {
+          readerMap.insert(std::make_pair(it->first, chainHelper<UserType>(nullptr, it->second.isTrace)));
+          auto& helper = readerMap[it->first];
+          helper.parr = &helper.arr;
+          if(helper.isTrace) {
+            _reader->_tree->SetBranchAddress(it->first.c_str(), &helper.parr, &helper.branch);
+          }
+          else {
+            _reader->_tree->SetBranchAddress(it->first.c_str(), &(helper.arr[0]), &helper.branch);
+          }
+          if(!helper.branch) throw std::runtime_error(std::string("Failed to find branch: ") + it->first);
+        }
+      }
+    };
+
+    struct ReadEvent {
+      ReadEvent(FileReader* reader, const Long64_t& localEntry, bool& ok)
+      : _reader(reader), _localEntry(localEntry), _ok(ok){};
+      FileReader* _reader;
+      Long64_t _localEntry;
+      bool& _ok;
+      template<typename PAIR>
+      void operator()(PAIR&) const {
+        typedef typename PAIR::first_type UserType;
+        auto& readerMap = boost::fusion::at_key<UserType>(_reader->_data.table);
+        for(auto it = readerMap.begin(); it != readerMap.end(); it++) {
+          if(it->second.branch->GetEntry(_localEntry) <= 0) _ok = false;
+        }
+      }
+    };
+
+    struct FillTimeLines {
+      FillTimeLines(FileReader* reader, const size_t& event, const Long64_t& eventID, const bool& valid)
+      : _reader(reader), _event(event), _eventID(eventID), _valid(valid){};
+      FileReader* _reader;
+      size_t _event;
+      Long64_t _eventID;
+      bool _valid;
+      template<typename PAIR>
+      void operator()(PAIR&) const {
+        typedef typename PAIR::first_type UserType;
+        auto& readerMap = boost::fusion::at_key<UserType>(_reader->_data.table);
+        for(auto it = readerMap.begin(); it != readerMap.end(); it++) {
+          // traces are created before the threads are started -> only use at() here to not modify the map
+          auto& currentTrace = _reader->_caller->timeLines.at(it->first);
+          if(_valid) {
+            currentTrace.y.at(_event) = reduceArray(it->second, _reader->_arrayPosition);
+          }
+          else {
+            currentTrace.y.at(_event) = std::numeric_limits<double>::quiet_NaN();
+          }
+          if(_reader->_timeAxis == TimeAxis::TRUE || (_reader->_timeAxis == TimeAxis::AUTO && !it->second.isTrace)) {
+            currentTrace.x.at(_event) = _reader->getTime();
+          }
+          else {
+            currentTrace.x.at(_event) = _eventID;
+          }
+        }
+      }
+    };
+
+    struct CopyValues {
+      CopyValues(FileReader* reader, std::vector<double>& values) : _reader(reader), _values(values){};
+      FileReader* _reader;
+      std::vector<double>& _values;
+      template<typename PAIR>
+      void operator()(PAIR&) const {
+        typedef typename PAIR::first_type UserType;
+        auto& readerMap = boost::fusion::at_key<UserType>(_reader->_data.table);
+        for(auto it = readerMap.begin(); it != readerMap.end(); it++) {
+          _values.resize(it->second.arr.GetSize());
+          for(Int_t i = 0; i < it->second.arr.GetSize(); i++) {
+            _values[i] = it->second.arr[i];
+          }
+        }
+      }
+    };
+
+    FileReader::FileReader(DataHandler* caller, const size_t& iFile)
+    : _caller(caller), _arrayPosition(caller->m_arrayPosition), _timeAxis(caller->m_timeAxis),
+      _file(TFile::Open(caller->m_fileNames.at(iFile).c_str())), _tree(nullptr),
+      _timeStamp(nullptr), _tinfo(nullptr), _timeBranch(nullptr) {
+      if(!_file || _file->IsZombie())
+        throw std::runtime_error(std::string("Failed to open file: ") + caller->m_fileNames.at(iFile));
+      _file->GetObject(caller->m_treeName.c_str(), _tree);
+      if(_tree == nullptr)
+        throw std::runtime_error(
+            std::string("Failed to read ") + caller->m_treeName + " from file: " + caller->m_fileNames.at(iFile));
+      if(caller->m_tinfo == nullptr) {
+        _timeStamp = new TTimeStamp();
+        _tree->SetBranchAddress("timeStamp", &_timeStamp, &_timeBranch);
+      }
+      else {
+        _tinfo = new hdf5converter::timeInfo_t();
+        _tree->SetBranchAddress("timeInfo", &_tinfo, &_timeBranch);
+      }
+      if(!_timeBranch) throw std::runtime_error("Failed to read timeInfo branch");
+      boost::fusion::for_each(_data.table, SetupReader(this));
+    }
+
+    FileReader::~FileReader() {
+      if(_tree != nullptr) _tree->ResetBranchAddresses();
+      _file.reset();
+      delete _timeStamp;
+      delete _tinfo;
+    }
+
+    bool FileReader::readEvent(const Long64_t& localEntry) {
+      bool ok = true;
+      if(_timeAxis != TimeAxis::FALSE) _timeBranch->GetEntry(localEntry);
+      boost::fusion::for_each(_data.table, ReadEvent(this, localEntry, ok));
+      return ok;
+    }
+
+    void FileReader::fillTimeLines(const size_t& event, const Long64_t& eventID, const bool& valid) {
+      boost::fusion::for_each(_data.table, FillTimeLines(this, event, eventID, valid));
+    }
+
+    std::vector<double> FileReader::getValues() {
+      std::vector<double> values;
+      boost::fusion::for_each(_data.table, CopyValues(this, values));
+      return values;
+    }
+
+    double FileReader::getTime() {
+      if(_tinfo == nullptr) {
+        return _timeStamp->GetSec() + _timeStamp->GetNanoSec() / 1e9;
+      }
+      else {
+        return _tinfo->timeStamp + _tinfo->msec * 1. / 1000;
+      }
+    }
+
+    /**
+     * Create the time lines for all active process variables.
+     */
+    struct CreateTraces {
+      CreateTraces(DataHandler* caller, const size_t& nMax) : _caller(caller), _nMax(nMax){};
+      DataHandler* _caller;
+      size_t _nMax;
+      template<typename PAIR>
+      void operator()(PAIR&) const {
+        typedef typename PAIR::first_type UserType;
+        auto& dataMap = boost::fusion::at_key<UserType>(_caller->data.table);
+        for(auto it = dataMap.begin(); it != dataMap.end(); it++) {
+          _caller->timeLines[it->first] = Trace(_nMax);
+        }
+      }
+    };
   } // namespace detail
 
   void DataHandler::prepareReading(const std::set<std::string>& processVariables) {
@@ -383,6 +620,7 @@ namespace uDAQ {
 
   void DataHandler::collectData() {
     BOOST_LOG_TRIVIAL(debug) << "Prepare structure..." << endl;
+    std::unique_lock<std::mutex> timeLinesLock(m_timeLinesMutex);
     timeLines.clear();
     size_t nMax = TMath::Ceil(1. * (m_end - m_start) / (1. * m_decimation));
     m_newFile = true;
@@ -392,21 +630,38 @@ namespace uDAQ {
     std::vector<Trace>::iterator itFill;
     size_t filledEvents = 0;
     size_t skippedEvents = 0;
-    // event loop
-    for(auto i = m_start; i < m_end; i += m_decimation) {
-      if(!prepareTree(i)) {
-        skippedEvents += 1;
-        continue;
-      }
-      if(!m_timeAxis == TimeAxis::FALSE) readTimeStamp();
-      boost::fusion::for_each(data.table, detail::UpdateData(this, nMax, filledEvents, i));
-      filledEvents++;
-      m_percentage = 100. * (filledEvents) / nMax;
-      if(m_interrupt) break;
-      m_newFile = false;
+    // create all traces before filling them -> the map is not changed while the time lines are filled
+    boost::fusion::for_each(data.table, detail::CreateTraces(this, nMax));
+    timeLinesLock.unlock();
+    if(m_nThreads > 1) {
+      filledEvents = collectDataParallel(nMax);
     }
-    // resize the traces in case there was an interrupt
-    if(m_interrupt) {
+    else {
+      // event loop
+      for(auto i = m_start; i < m_end; i += m_decimation) {
+        if(!prepareTree(i)) {
+          skippedEvents += 1;
+          continue;
+        }
+        if(!m_timeAxis == TimeAxis::FALSE) readTimeStamp();
+        bool valid = true;
+        boost::fusion::for_each(data.table, detail::UpdateData(this, nMax, filledEvents, i, &valid));
+        if(valid) {
+          filledEvents++;
+          m_filled = filledEvents;
+        }
+        else {
+          // the position is filled by the next event
+          skippedEvents += 1;
+        }
+        m_percentage = 100. * (filledEvents + skippedEvents) / nMax;
+        if(m_interrupt) break;
+        m_newFile = false;
+      }
+    }
+    // resize the traces in case there was an interrupt or not all events could be filled
+    if(m_interrupt || filledEvents < nMax) {
+      std::lock_guard<std::mutex> lock(m_timeLinesMutex);
       for(auto it = timeLines.begin(); it != timeLines.end(); it++) {
         it->second.x.resize(filledEvents);
         it->second.y.resize(filledEvents);
@@ -414,7 +669,113 @@ namespace uDAQ {
     }
     if(skippedEvents > 0) BOOST_LOG_TRIVIAL(error) << "Skipped " << skippedEvents << " due to read errors." << endl;
     BOOST_LOG_TRIVIAL(debug) << "Collected data of " << filledEvents << " events." << endl;
-    m_done = true;
+    setDone();
+  }
+
+  void DataHandler::runParallel(const std::function<void(const size_t&)>& processFile) {
+    std::atomic<size_t> nextFile(0);
+    std::vector<std::thread> threads;
+    for(size_t iThread = 0; iThread < std::min(m_nThreads, m_fileNames.size()); iThread++) {
+      threads.emplace_back([&]() {
+        for(size_t iFile = nextFile++; iFile < m_fileNames.size() && !m_interrupt; iFile = nextFile++) {
+          try {
+            processFile(iFile);
+          }
+          catch(std::exception& e) {
+            BOOST_LOG_TRIVIAL(error) << "Failed processing file " << m_fileNames.at(iFile) << ": " << e.what() << endl;
+          }
+        }
+      });
+    }
+    for(auto& t : threads) t.join();
+  }
+
+  size_t DataHandler::collectDataParallel(const size_t& nMax) {
+    // range of events [first, last) on the decimation grid for each file
+    std::vector<std::pair<Long64_t, Long64_t>> ranges;
+    std::vector<size_t> expected(m_fileNames.size(), 0);
+    Long64_t decimation = m_decimation;
+    for(size_t iFile = 0; iFile < m_fileNames.size(); iFile++) {
+      Long64_t first = std::max((Long64_t)m_start, m_treeOffsets[iFile]);
+      first = m_start + ((first - m_start + decimation - 1) / decimation) * decimation;
+      Long64_t last = std::min((Long64_t)m_end, m_treeOffsets[iFile + 1]);
+      ranges.push_back(std::make_pair(first, last));
+      if(last > first) expected[iFile] = (last - first + decimation - 1) / decimation;
+    }
+    // events that could not be read are removed after all files are processed, like in the serial event loop
+    std::vector<char> valid(nMax, 1);
+    std::vector<std::atomic<size_t>> filled(m_fileNames.size());
+    for(auto& f : filled) f = 0;
+    std::atomic<size_t> processed(0);
+    std::atomic<size_t> skipped(0);
+    // update m_filled: files before frontier are completely filled
+    std::mutex filledMutex;
+    size_t frontier = 0;
+    size_t filledBefore = 0;
+    auto updateFilled = [&]() {
+      std::lock_guard<std::mutex> lock(filledMutex);
+      while(frontier < filled.size() && filled[frontier] == expected[frontier]) {
+        filledBefore += expected[frontier];
+        frontier++;
+      }
+      m_filled = filledBefore + (frontier < filled.size() ? filled[frontier].load() : 0);
+    };
+    runParallel([&](const size_t& iFile) {
+      if(expected[iFile] == 0) return;
+      // position of the first event of the file in the time lines
+      size_t first = (ranges[iFile].first - m_start) / decimation;
+      try {
+        detail::FileReader reader(this, iFile);
+        for(auto i = ranges[iFile].first; i < ranges[iFile].second; i += decimation) {
+          bool ok = reader.readEvent(i - m_treeOffsets[iFile]);
+          if(!ok) {
+            skipped++;
+            valid[(i - m_start) / decimation] = 0;
+          }
+          reader.fillTimeLines((i - m_start) / decimation, i, ok);
+          filled[iFile]++;
+          updateFilled();
+          m_percentage = 100. * (++processed) / nMax;
+          if(m_interrupt) break;
+        }
+      }
+      catch(std::exception&) {
+        // skip the remaining events of the file, so the following files are not held back by the frontier
+        size_t nRemaining = expected[iFile] - filled[iFile];
+        for(size_t event = first + filled[iFile]; event < first + expected[iFile]; event++) {
+          valid[event] = 0;
+          for(auto& timeLine : timeLines) {
+            timeLine.second.x[event] = std::numeric_limits<double>::quiet_NaN();
+            timeLine.second.y[event] = std::numeric_limits<double>::quiet_NaN();
+          }
+        }
+        skipped += nRemaining;
+        filled[iFile] = expected[iFile];
+        updateFilled();
+        processed += nRemaining;
+        m_percentage = 100. * processed / nMax;
+        throw;
+      }
+    });
+    if(skipped > 0) BOOST_LOG_TRIVIAL(error) << "Failed reading data for " << skipped << " events." << endl;
+    updateFilled();
+    size_t nFilled = m_filled;
+    if(skipped == 0) return nFilled;
+    // remove the skipped events -> only events before the first skipped one keep their position
+    // the lock prevents copying the filled events while they are moved (see getFilledTimeLines)
+    std::lock_guard<std::mutex> lock(m_timeLinesMutex);
+    size_t firstSkipped = std::find(valid.begin(), valid.begin() + nFilled, 0) - valid.begin();
+    size_t nValid = firstSkipped;
+    for(size_t event = firstSkipped; event < nFilled; event++) {
+      if(!valid[event]) continue;
+      for(auto& timeLine : timeLines) {
+        timeLine.second.x[nValid] = timeLine.second.x[event];
+        timeLine.second.y[nValid] = timeLine.second.y[event];
+      }
+      nValid++;
+    }
+    m_filled = nValid;
+    return nValid;
   }
 
   void DataHandler::getTimeLine(
@@ -482,7 +843,7 @@ namespace uDAQ {
     prepareReading(s);
     if(m_lastTrigger != nullptr && *m_trigger.get() == *m_lastTrigger.get()) {
       BOOST_LOG_TRIVIAL(info) << "Trigger did not change. No search necessary." << endl;
-      m_done = true;
+      setDone();
       return;
     }
     BOOST_LOG_TRIVIAL(debug) << "Trigger threshold is: " << m_trigger->threshold << endl;
@@ -492,6 +853,8 @@ namespace uDAQ {
       BOOST_LOG_TRIVIAL(warning) << "Array position for process variables that are no traces should be 0 instead of "
                                  << m_trigger->arrayPosition << " for triggered process variable: " << processVariable
                                  << ". No search will be performed." << endl;
+      m_percentage = 100;
+      setDone();
       return;
     }
     BOOST_LOG_TRIVIAL(debug) << "Start trigger search..." << endl;
@@ -508,64 +871,38 @@ namespace uDAQ {
         BOOST_LOG_TRIVIAL(error) << "Wrong start event(" << event << ") given when starting a trigger search!" << endl;
         m_trigger->nextEvent = -1;
         m_percentage = 100;
-        m_done = true;
+        setDone();
         return;
       }
     }
 
     // set default search result to no match found
     m_trigger->nextEvent = -1;
-    //  for(Long64_t event = 0; event < m_nEntries; event++){
-    while(true) {
-      if(!prepareTree(event)) {
-        continue;
-      }
-      // always use the same event id -> the same Trace is used every time and the data is replaced
-      boost::fusion::for_each(data.table, detail::UpdateData(this, 1, 0, -1));
-      const Trace* tl = &timeLines[processVariable];
-      if(m_trigger->arrayPosition >= 0) {
-        m_trigger->testValue(tl->y.at(m_trigger->arrayPosition), event);
-      }
-      else if(m_trigger->arrayPosition == -1) {
-        if(tl->y.size() > 0) {
-          auto mean = std::accumulate(tl->y.begin(), tl->y.end(), 0.0) / tl->y.size();
-          m_trigger->testValue(mean, event);
-        }
-        else {
-          BOOST_LOG_TRIVIAL(error) << "Array size is 0 in trigger decision calculation." << endl;
-        }
-      }
-      else if(m_trigger->arrayPosition == -2) {
-        auto max = std::max_element(tl->y.begin(), tl->y.end());
-        m_trigger->testValue(*max, event);
-      }
-      else if(m_trigger->arrayPosition == -3) {
-        auto min = std::min_element(tl->y.begin(), tl->y.end());
-        m_trigger->testValue(*min, event);
-      }
-      else if(m_trigger->arrayPosition == -4) {
-        for(size_t index = 0; index < tl->y.size(); index++) {
-          m_trigger->testValue(tl->y.at(index), event);
+    if(!m_trigger->simpleSearch && m_nThreads > 1) {
+      getTriggerDecisionParallel();
+    }
+    else {
+      //  for(Long64_t event = 0; event < m_nEntries; event++){
+      while(true) {
+        if(!prepareTree(event)) {
+          continue;
         }
-      }
-      else {
-        std::stringstream ss;
-        ss << "Unknown array position given: " << m_trigger->arrayPosition
-           << ". Allowed values are >0, -1 (mean), -2 (max), -3 (min), -4 (any)";
-        throw std::runtime_error(ss.str());
-      }
-      processed += 1;
-      m_percentage = 100. * processed / (1. * toProcess);
-      m_newFile = false;
-      if(m_interrupt) break;
+        // always use the same event id -> the same Trace is used every time and the data is replaced
+        boost::fusion::for_each(data.table, detail::UpdateData(this, 1, 0, -1));
+        m_trigger->testTrace(timeLines[processVariable].y, event);
+        processed += 1;
+        m_percentage = 100. * processed / (1. * toProcess);
+        m_newFile = false;
+        if(m_interrupt) break;
 
-      // stop simple serach if trigger was found
-      if(m_trigger->simpleSearch && m_trigger->triggeredEvents[event]) {
-        m_trigger->nextEvent = event;
-        break;
+        // stop simple serach if trigger was found
+        if(m_trigger->simpleSearch && m_trigger->triggeredEvents[event]) {
+          m_trigger->nextEvent = event;
+          break;
+        }
+        event = getNextEvent(event, m_trigger->increase);
+        if(event < 0) break;
       }
-      event = getNextEvent(event, m_trigger->increase);
-      if(event < 0) break;
     }
     if(m_trigger->simpleSearch) {
       if(m_trigger->nextEvent >= 0)
@@ -578,7 +915,25 @@ namespace uDAQ {
     }
     m_lastTrigger.reset(new triggerData(std::move(*m_trigger.get())));
     m_percentage = 100;
-    m_done = true;
+    setDone();
+  }
+
+  void DataHandler::getTriggerDecisionParallel() {
+    std::atomic<size_t> processed(0);
+    runParallel([&](const size_t& iFile) {
+      detail::FileReader reader(this, iFile);
+      for(auto event = m_treeOffsets[iFile]; event < m_treeOffsets[iFile + 1]; event++) {
+        // every thread writes to different events of triggeredEvents only
+        if(reader.readEvent(event - m_treeOffsets[iFile])) {
+          m_trigger->testTrace(reader.getValues(), event);
+        }
+        else {
+          BOOST_LOG_TRIVIAL(error) << "Failed reading data for event: " << event << endl;
+        }
+        m_percentage = 100. * (++processed) / (1. * m_nEntries);
+        if(m_interrupt) break;
+      }
+    });
   }
 
   void DataHandler::startTriggerSearch(std::string processVariable, const double& triggerThreshold,
@@ -637,6 +992,15 @@ namespace uDAQ {
     }
   }
 
+  void DataHandler::setNThreads(const size_t& nThreads) {
+    if(nThreads > 1) {
+      // required since files are opened and read in several threads
+      ROOT::EnableThreadSafety();
+    }
+    m_nThreads = std::max(nThreads, (size_t)1);
+    BOOST_LOG_TRIVIAL(info) << "Using " << m_nThreads << " threads for event loops." << endl;
+  }
+
   void DataHandler::setLogLevel(int logLevel) {
     if(logLevel == 0) {
       boost::log::core::get()->set_filter(boost::log::trivial::severity >= boost::log::trivial::debug);
@@ -654,6 +1018,23 @@ namespace uDAQ {
     readTimeStamp();
   }
 
+  std::vector<double> DataHandler::readTimeStamps() {
+    std::vector<double> timeStamps(m_nEntries, std::numeric_limits<double>::quiet_NaN());
+    m_newFile = true;
+    for(Long64_t event = 0; event < m_nEntries; event++) {
+      if(!prepareTree(event)) continue;
+      readTimeStamp();
+      if(m_tinfo == nullptr) {
+        timeStamps[event] = m_timeStamp->GetSec() + m_timeStamp->GetNanoSec() / 1e9;
+      }
+      else {
+        timeStamps[event] = m_tinfo->timeStamp + m_tinfo->msec * 1. / 1000;
+      }
+      m_newFile = false;
+    }
+    return timeStamps;
+  }
+
   void DataHandler::readTimeStamp() {
     if(m_timeStamp != nullptr) m_timeStampBranch->GetEntry(m_localEntry);
     if(m_tinfo != nullptr) m_tBranch->GetEntry(m_localEntry);
@@ -701,10 +1082,27 @@ namespace uDAQ {
     std::pair<bool, double> p;
     p.first = m_done;
     p.second = m_percentage;
-    if(m_done) m_worker->join();
+    if(m_done && m_worker->joinable()) m_worker->join();
     return p;
   }
 
+  std::map<std::string, Trace> DataHandler::getFilledTimeLines() {
+    std::lock_guard<std::mutex> lock(m_timeLinesMutex);
+    std::map<std::string, Trace> filled;
+    size_t nFilled = m_filled;
+    for(auto& timeLine : timeLines) {
+      auto& trace = filled[timeLine.first];
+      trace.x.assign(timeLine.second.x.begin(), timeLine.second.x.begin() + nFilled);
+      trace.y.assign(timeLine.second.y.begin(), timeLine.second.y.begin() + nFilled);
+    }
+    return filled;
+  }
+
+  bool DataHandler::waitDone(const size_t& timeout) {
+    std::unique_lock<std::mutex> lock(m_doneMutex);
+    return m_doneCondition.wait_for(lock, std::chrono::milliseconds(timeout), [this] { return m_done.load(); });
+  }
+
   std::string DataHandler::extractTreeName(const std::string& file) {
     TFile* f = TFile::Open(file.c_str());
     auto l = f->GetListOfKeys();
@@ -233,11 +233,26 @@ if __name__ == '__main__':
                       help='Give the maximum number of file to be opened. If n files are opened these are the last n files in history.  Only applies to HDF5 files.')
   parser.add_argument('--nPlots', type=int, default = 9,
                       help='Set number of available plot slots')
+  parser.add_argument('--nProcesses', type=int, default = 1,
+                      help='Number of processes used to collect time lines. Events of different files are read in parallel. Only applies to HDF5 files.')
+  parser.add_argument('--maxOpenFiles', type=int, default = 64,
+                      help='Maximum number of files kept open at the same time. Files are reopened on demand. Only applies to HDF5 files.')
+  parser.add_argument('--chunkCacheSize', type=float, default = None,
+                      help='Size of the HDF5 raw data chunk cache per open file in MB. The HDF5 default is 1 MB. Only applies to HDF5 files.')
+  parser.add_argument('--chunkCacheSlots', type=int, default = None,
+                      help='Number of slots of the HDF5 raw data chunk cache. Should be a prime number about 100 times the number of chunks fitting in the cache. Only applies to HDF5 files.')
+  parser.add_argument('--columnStore', type=str, default = None,
+                      help='Directory of a column store created by convert2columns.py. It is used instead of the HDF5 files if it includes all files. Only applies to HDF5 files.')
+  parser.add_argument('--summary', action='store_true',
+                      help='Use and create precomputed summaries (stored in .uDAQ_summary next to the DAQ files) for time lines with many events. '
+                      'The minimum and maximum per time bucket are shown instead of the single events. Only applies to HDF5 files.')
   if found_root:
     parser.add_argument('--useHDF5', action='store_true',
                         help='Set true if working on hdf5 files.')
     parser.add_argument('--averaging', type=int, default = 36,
                         help='Only applies if llrf_server_data is analysed. Specify the IQ detection length used in the LLRF firmware when averaging (e.g. 6 for fast firmware or 36 for slow firmware).')  
+    parser.add_argument('--nThreads', type=int, default = 1,
+                        help='Number of threads used to collect time lines and to do a complete trigger search. Files are distributed over the threads. Only applies to ROOT files.')
   
   args = parser.parse_args()
   # Set logging options
@@ -4,7 +4,7 @@
 
 from chimeratk_daq.MicroDAQviewerUI_live import Ui_MainWindow
 
-from PyQt5.QtCore import pyqtSignal, QSettings, QTimer, QObject
+from PyQt5.QtCore import QSettings, QTimer, QObject
 from PyQt5.Qt import QApplication, QMainWindow, Qt, QMenu, QColor, QBrush, QTableWidgetItem
 
 import pyqtgraph as pg
@@ -16,6 +16,7 @@ found_opcua = True
 try:
   from uaclient.uaclient import UaClient
   from opcua import ua
+  from chimeratk_daq.SubscriptionManager import SubscriptionManager, SubscriptionGroup
 except ImportError:
   found_opcua = False
 
@@ -23,10 +24,14 @@ import numpy
 
 import sys
 import argparse
+import threading
+from collections import deque
 import logging.config
-from datetime import datetime
+import time
+from datetime import timezone
 
 from chimeratk_daq.TimeXAxis import DateAxisItem, getDateString
+from chimeratk_daq.RingBuffer import RingBuffer
 
 LOGGING = {
     'version': 1,
@@ -80,20 +85,179 @@ def dragMoveEventGraph(ev):
 
 
 class DataChangeHandler(QObject):
-  fire = pyqtSignal(object, object, str)
+  '''
+  Collects the data change notifications of the subscriptions.
+  Notifications are called from the OPC UA client thread. They are not forwarded one by one
+  but queued per node and fetched by the GUI in its render loop (see takePending).
+  Thus fast publishing servers do not flood the GUI event queue.
+  Array nodes can have a time stamp node (see addTimeStampNode). Its values are paired with the
+  values of the array node by the source time stamp in the client thread, so the GUI never has to
+  read the time stamps itself. Values of a time stamp node are only queued themselves if it is
+  shown directly as well (see setDirect). If the matching time stamps do not arrive within pairTimeout, e.g. because the
+  time stamp node is updated less often or not at all, the value is shown without time stamps.
+  @param maxQueue(int): Maximum number of values kept per node between two calls of takePending.
+                        If more values arrive the oldest ones are dropped.
+  @param pairTimeout(float): Maximum time in seconds a value waits for its time stamps.
+  '''
     
-  def __init__(self):
+  def __init__(self, maxQueue = 10000, pairTimeout = 1.):
     QObject.__init__(self)
+    self.maxQueue = maxQueue
+    self.pairTimeout = pairTimeout
+    self.pending = {}       # node -> deque of (value, timestamp, time stamp array or None)
+    self.timeStampNodes = {} # time stamp node -> value node
+    self.valueNodes = {}    # value node -> time stamp node
+    self.timeStamps = {}    # value node -> (timestamp, time stamp array) last received from the time stamp node
+    self.waiting = {}       # value node -> (value, timestamp, arrival time) waiting for the matching time stamp array
+    self.direct = set()     # time stamp nodes that are also shown directly
+    self.nReceived = 0
+    self.nDropped = 0
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def toSeconds(dt):
+    '''
+    @return Seconds since EPOCH of an OPC UA time stamp. Time stamps without time zone are UTC.
+    '''
+    if dt.tzinfo == None:
+      dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+  def addTimeStampNode(self, node, timeStampNode):
+    '''
+    Pair the values of node with the values of timeStampNode. Both nodes have to be subscribed with this handler.
+    '''
+    with self.lock:
+      self.timeStampNodes[timeStampNode] = node
+      self.valueNodes[node] = timeStampNode
+
+  def removeTimeStampNode(self, timeStampNode):
+    with self.lock:
+      node = self.timeStampNodes.pop(timeStampNode, None)
+      self.valueNodes.pop(node, None)
+      self.timeStamps.pop(node, None)
+      self.waiting.pop(node, None)
+      self.direct.discard(timeStampNode)
+
+  def setDirect(self, timeStampNode, direct):
+    '''
+    Set if the values of a time stamp node are shown directly in addition to pairing them with the array values.
+    '''
+    with self.lock:
+      if direct:
+        self.direct.add(timeStampNode)
+      else:
+        self.direct.discard(timeStampNode)
 
   def datachange_notification(self, node, val, data):
       if data.monitored_item.Value.SourceTimestamp:
-          timestamp = data.monitored_item.Value.SourceTimestamp.isoformat()
+          timestamp = DataChangeHandler.toSeconds(data.monitored_item.Value.SourceTimestamp)
       elif data.monitored_item.Value.ServerTimestamp:
-          timestamp = data.monitored_item.Value.ServerTimestamp.isoformat()
+          timestamp = DataChangeHandler.toSeconds(data.monitored_item.Value.ServerTimestamp)
       else:
-          timestamp = datetime.now().isoformat()
-      self.fire.emit(node, val, timestamp)
+          timestamp = time.time()
+      with self.lock:
+        self.nReceived = self.nReceived + 1
+        if node in self.timeStampNodes:
+          self.pairTimeStamps(self.timeStampNodes[node], val, timestamp)
+          if node in self.direct:
+            self.queue(node, val, timestamp, None)
+        elif node in self.valueNodes:
+          self.pairValue(node, val, timestamp)
+        else:
+          self.queue(node, val, timestamp, None)
+
+  def pairTimeStamps(self, node, timeStamps, timestamp):
+    '''
+    Handle a new time stamp array of the given value node. Called with the lock held.
+    '''
+    self.timeStamps[node] = (timestamp, timeStamps)
+    if node in self.waiting:
+      (val, valueTimestamp, arrival) = self.waiting[node]
+      if valueTimestamp == timestamp:
+        del self.waiting[node]
+        self.queue(node, val, valueTimestamp, timeStamps)
+      elif valueTimestamp < timestamp:
+        # the matching time stamps will not arrive anymore
+        del self.waiting[node]
+        self.queue(node, val, valueTimestamp, None)
+
+  def pairValue(self, node, val, timestamp):
+    '''
+    Handle a new value of a node with time stamp node. Called with the lock held.
+    '''
+    if node in self.waiting:
+      # the time stamps of the older value did not arrive in time -> show it without time stamps
+      (oldVal, oldTimestamp, arrival) = self.waiting.pop(node)
+      self.queue(node, oldVal, oldTimestamp, None)
+    (timeStampsTimestamp, timeStamps) = self.timeStamps.get(node, (None, None))
+    if timeStampsTimestamp == timestamp:
+      self.queue(node, val, timestamp, timeStamps)
+    elif timeStampsTimestamp != None and timeStampsTimestamp > timestamp:
+      self.queue(node, val, timestamp, None)
+    else:
+      self.waiting[node] = (val, timestamp, time.monotonic())
+
+  def queue(self, node, val, timestamp, timeStamps):
+    if not node in self.pending:
+      self.pending[node] = deque(maxlen=self.maxQueue)
+    elif len(self.pending[node]) == self.maxQueue:
+      self.nDropped = self.nDropped + 1
+    self.pending[node].append((val, timestamp, timeStamps))
+
+  def takePending(self):
+    '''
+    @return Dictionary of node to list of (value, timestamp, time stamp array) received since the last call,
+            oldest first. The time stamps are given in seconds since EPOCH. The time stamp array is None
+            if the node has no time stamp node or no matching time stamps were received.
+            Values waiting longer than pairTimeout for their time stamps are included without time stamps.
+    '''
+    with self.lock:
+      now = time.monotonic()
+      for (node, (val, timestamp, arrival)) in list(self.waiting.items()):
+        if now - arrival > self.pairTimeout:
+          del self.waiting[node]
+          self.queue(node, val, timestamp, None)
+      pending = self.pending
+      self.pending = {}
+    return {node: list(values) for (node, values) in pending.items()}
       
+class NodeInfo():
+  '''
+  Metadata of a subscribed node. It is read once when the node is subscribed, so updating
+  the GUI does not need to access the server.
+  @param node(opcua.Node): The node.
+  @param client(opcua.Client): The client used for reading.
+  '''
+  def __init__(self, node, client):
+    self.name = str(node.nodeid.Identifier)
+    self.description = ""
+    self.dataType = None
+    self.arrayLength = None # None for scalars, 0 for arrays of unknown length
+    self.unit = ""
+    self.properties = {}    # browse name -> value of the child variables of the node
+    try:
+      # one read request for all attributes
+      (description, dataType, valueRank, arrayDimensions) = [attribute.Value.Value for attribute in node.get_attributes(
+        [ua.AttributeIds.Description, ua.AttributeIds.DataType, ua.AttributeIds.ValueRank, ua.AttributeIds.ArrayDimensions])]
+      self.description = description.Text if description != None and description.Text != None else ""
+      if dataType != None:
+        self.dataType = ua.ObjectIdNames.get(dataType.Identifier, str(dataType))
+      if valueRank != None and valueRank > 0:
+        self.arrayLength = arrayDimensions[0] if arrayDimensions else 0
+    except ua.UaError as e:
+      logger_client.debug("Failed to read attributes of node {}: {}".format(self.name, e))
+    try:
+      # one browse request and one read request for all child variables
+      children = node.get_children_descriptions(refs=ua.ObjectIds.HasComponent, nodeclassmask=ua.NodeClass.Variable)
+      values = client.get_values([client.get_node(child.NodeId) for child in children]) if len(children) > 0 else []
+      self.properties = {child.BrowseName.Name: value for (child, value) in zip(children, values)}
+      if len(values) > 2:
+        # the unit is the third variable of the ChimeraTK OPC UA server
+        self.unit = str(values[2])
+    except ua.UaError as e:
+      logger_client.debug("Failed to read properties of node {}: {}".format(self.name, e))
+
 class TableManager():
   
   def __init__(self, app):
@@ -112,59 +276,61 @@ class TableManager():
     if node == None:
       logger_client.warning("No node selected yet. Connect to server first!")
       return
-    if node in self.app.nodes:
-      logger_client.info("No subscription added since node is already subscribed.")
-    else:
-      logger_client.info("Adding subscription for " + node.nodeid.Identifier)
-      self._subscription = self.app.uaclient.subscribe_datachange(node, self.app.handler)
+    if not self.app.subscribe([node]):
+      return
     # list holding the node and the row [name, row]
     self.app.tableWidget.insertRow(self.app.tableWidget.rowCount())
     self.tableItems.append([node, self.app.tableWidget.rowCount()-1])
-    self.app.nodes.append(node)
     self.updateTable(node, None)
       
   def updateTable(self, node, value):
-    #\ToDo: Fix filling table for the new server structure
+    '''
+    Update the rows of the given node. Name and unit are taken from the NodeInfo and are only set if
+    value is None, i.e. when the row is added. Else only the value column is changed.
+    '''
     for parameter in self.tableItems:
       # find row to update
       if node == parameter[0]:
-        # set parameter name
-        item = QTableWidgetItem()
-        item.setText(parameter[0].nodeid.Identifier)
-        self.app.tableWidget.setItem(parameter[1],0, item)
-        item = QTableWidgetItem()
-        item.setText(parameter[0].get_variables()[2].get_value())
-        self.app.tableWidget.setItem(parameter[1],2, item)
-
-        if value != None:
+        if value == None:
+          info = self.app.nodeInfos.get(node)
+          # set parameter name
+          item = QTableWidgetItem()
+          item.setText(parameter[0].nodeid.Identifier)
+          if info != None:
+            item.setToolTip(info.description)
+          self.app.tableWidget.setItem(parameter[1],0, item)
           item = QTableWidgetItem()
+          item.setText(info.unit if info != None else "")
+          self.app.tableWidget.setItem(parameter[1],2, item)
+        else:
+          item = self.app.tableWidget.item(parameter[1],1)
+          if item == None:
+            item = QTableWidgetItem()
+            self.app.tableWidget.setItem(parameter[1],1, item)
           if type(value) == list:
             arr = numpy.asanyarray(value, dtype = numpy.float32)
             item.setForeground(QBrush(QColor("#48ba0b")))
             item.setText("µ="+"%.3f" % arr.mean() + " σ=" + "%.3f" % arr.std())
           else:
             item.setText("%.3f" % value)
-          self.app.tableWidget.setItem(parameter[1],1, item)
         
   def removeRows(self, rows):
     # sort and start deleting the last row first to ensure the remaining row numbers are correct!
-    rows.sort(reverse=True)
+    rows = sorted(set(rows), reverse=True)
+    nodes = []
     for row in rows:
       for par in self.tableItems:
         if par[1] == row:
-          if self.app.nodes.count(par[0]) > 1:
-            # do not remove the subscription because of other observers
-            logger_client.info("Not removing subscription for " + par[0].nodeid.Identifier)
-            self.app.nodes.remove(par[0])
-          elif self.app.nodes.count(par[0]) == 1:
-            # remove the subscription because this is the only observer
-            logger_client.info("Removing subscription for " + par[0].nodeid.Identifier)
-            self.app.uaclient.unsubscribe_datachange(par[0])
-            self.app.nodes.remove(par[0])
-          else:
-            logger_client.error("Tried to handle node from PlotManager that was not registered to the GUI!")          
+          nodes.append(par[0])
+          self.tableItems.remove(par)
+          break
       self.app.tableWidget.removeRow(row)
-      self.tableItems.remove(par)
+      # rows below the removed one move up
+      for par in self.tableItems:
+        if par[1] > row:
+          par[1] = par[1] - 1
+    # remove all observers with one call
+    self.app.unsubscribe(nodes)
     
 
 
@@ -185,6 +351,8 @@ class PlotManager():
     self.timeAxisActive = False
     self.name = "Plot " + str(self.ID)
     self.node = None
+    self.curve = None       # PlotDataItem reused for all updates of the node
+    self.title = None
 
 
   def putGraph(self):
@@ -194,26 +362,15 @@ class PlotManager():
     if node == None:
       logger_client.warning("No node selected yet. Connect to server first!")
       return
+    if not self.app.subscribe([node]):
+      return
+    # remove the old observer after adding the new one, so the monitored item is kept if the node is the same
     if self.node != None:
-      if self.app.nodes.count(self.node) > 1:
-        # do not remove the subscription because of other observers
-        logger_client.info("Not removing subscription for " + node.nodeid.Identifier)
-        self.app.nodes.remove(self.node)
-      elif self.app.nodes.count(self.node) == 1:
-        # remove the subscription because this is the only observer
-        logger_client.info("Removing subscription for " + node.nodeid.Identifier)
-        self.app.uaclient.unsubscribe_datachange(self.node)
-        self.app.nodes.remove(self.node)
-      else:
-        logger_client.error("Tried to handle node from PlotManager that was not registered to the GUI!")
-    if node in self.app.nodes:
-      logger_client.info("No subscription added since node is already subscribed.")
-    else:
-      logger_client.info("Adding subscription for " + node.nodeid.Identifier)
-      self._subscription = self.app.uaclient.subscribe_datachange(node, self.app.handler)
+      self.app.unsubscribe([self.node])
     self.node = node
-    #append the node to count the observers
-    self.app.nodes.append(self.node)
+    self.plot.clear()
+    self.curve = None
+    self.title = None
       
 
   def dropEvent(self, ev):
@@ -221,18 +378,18 @@ class PlotManager():
     ev.accept()
     self.putGraph()
       
-  def _update_subscription_model(self, node, value, timestamp):
+  def _update_subscription_model(self, node, value, timestamp, timeStamps = None):
     logger_client.debug("Subscribed value changed: " + str(value) + " TimeStamp: " + str(timestamp))
-    self.plot.clear()
-    curve = self.plot.plot()
-    self.plot.setTitle(node.nodeid.Identifier)
+    if self.curve == None:
+      self.curve = self.plot.plot()
+    curve = self.curve
+    if self.title != node.nodeid.Identifier:
+      self.title = node.nodeid.Identifier
+      self.plot.setTitle(self.title)
     # @ToDo: Here we know if it is an array or a scalar -> fill to plot or table
     if type(value) == list:
-      # try to read timeStamp array
-      timeStampNode = node.nodeid.Identifier.replace("Value","_timeStampsValue")
-      try:
-        timeStamps = self.app.uaclient.get_node(ua.NodeId(timeStampNode,node.nodeid.NamespaceIndex)).get_value()
-        logger_client.debug("Found time stamps for array data of node: " + node.nodeid.Identifier)
+      # time stamps are paired with the values by the DataChangeHandler
+      if timeStamps != None and len(timeStamps) == len(value):
         if self.timeAxisActive == False:
           self.axis.attachToPlotItem()
           self.timeAxisActive = True
@@ -240,12 +397,17 @@ class PlotManager():
         v1 = numpy.array(timeStamps)
         v2 = numpy.array(value)
         curve.setData(v1[v1 != 0], v2[v1 != 0])
-      except:
-        logger_client.debug("No time stamps found for array data of node: " + node.nodeid.Identifier)
+      else:
         if self.timeAxisActive == True:
           self.axis.detachFromPlotItem()
           self.timeAxisActive = False
         curve.setData(range(0, len(value)), value)
+    elif node in self.app.histories:
+      # strip chart of the latest values
+      if self.timeAxisActive == False:
+        self.axis.attachToPlotItem()
+        self.timeAxisActive = True
+      curve.setData(*self.app.histories[node].getData())
     else:
       if self.timeAxisActive == True:
         self.axis.detachFromPlotItem()
@@ -271,6 +433,7 @@ class MicroDAQviewer_live(QMainWindow, Ui_MainWindow):
         self.show_error(ex)
         raise
 
+    self.subscriptions = SubscriptionManager(self.uaclient.client, self.handler, self.subscriptionGroups, self.maxItems)
     self._update_address_list(uri)
     self.tree_ui.set_root_node(self.uaclient.client.get_root_node())
     self.load_current_node()
@@ -290,14 +453,17 @@ class MicroDAQviewer_live(QMainWindow, Ui_MainWindow):
     for r in self.tableManager.tableItems:
       l.append(r[1])
     self.tableManager.removeRows(l)
-    #remove remaining nodes
-    for i in set(self.nodes):
+    #remove remaining nodes by deleting the subscriptions
+    if self.subscriptions != None:
       try:
-        self.uaclient.unsubscribe_datachange(i)
+        self.subscriptions.clear()
       except Exception as e:
-        logging.warning("Failed to unsubscribe variable: " + i.nodeid.Identifier)
+        logging.warning("Failed to delete subscriptions.")
         self.show_error(e)
-    self.nodes.clear()
+      self.subscriptions = None
+    self.histories.clear()
+    self.timeStampNodes.clear()
+    self.nodeInfos.clear()
 
     for p in self.plotManagers:
       p.node = None
@@ -313,7 +479,6 @@ class MicroDAQviewer_live(QMainWindow, Ui_MainWindow):
         #reset handler and uaclient
         self.handler = DataChangeHandler()
         self.uaclient = UaClient()
-        self.handler.fire.connect(self.updateNode, type=Qt.QueuedConnection)
           
         
   def save_current_node(self):
@@ -359,10 +524,109 @@ class MicroDAQviewer_live(QMainWindow, Ui_MainWindow):
     menu.addAction("Remove selected rows", lambda: self.tableManager.removeRows(rows))
     menu.exec_(self.tableWidget.viewport().mapToGlobal(position))
         
-  def updateNode(self, node, value, timestamp):
+  def render(self):
+    '''
+    Render loop called with the configured frame rate.
+    All values of numeric scalars are added to the history of the node (see histories), which is
+    shown as strip chart. Apart from that only the latest value of each node is shown.
+    '''
+    for (node, values) in self.handler.takePending().items():
+      (value, timestamp, timeStamps) = values[-1]
+      if type(value) != list:
+        self.addHistory(node, values)
+      self.updateNode(node, value, timestamp, timeStamps)
+
+  def addHistory(self, node, values):
+    '''
+    Add scalar values to the history of a node.
+    @param values(list): List of (value, timestamp, time stamp array).
+    '''
+    try:
+      y = numpy.array([entry[0] for entry in values], dtype=numpy.float64)
+    except (TypeError, ValueError):
+      # not a numeric value, e.g. a string
+      return
+    if not node in self.histories:
+      self.histories[node] = RingBuffer(self.historyDepth)
+    self.histories[node].extend(numpy.array([entry[1] for entry in values]), y)
+
+  def subscribe(self, nodes):
+    '''
+    Add an observer to each of the given nodes (see SubscriptionManager). For arrays the corresponding time stamp
+    node (<name>_timeStampsValue) is subscribed in the same request if it exists and its values are paired with
+    the array values by the handler. The metadata of new nodes is read before (see NodeInfo), so only arrays
+    are paired.
+    @return True if all nodes are subscribed.
+    '''
+    if self.subscriptions == None:
+      logger_client.warning("Not connected. Connect to server first!")
+      return False
+    newNodes = [node for node in set(nodes) if not node in self.nodeInfos]
+    # the metadata is needed before subscribing to know which nodes are arrays
+    nodeInfos = {node: NodeInfo(node, self.uaclient.client) for node in newNodes}
+    timeStampNodes = {}
+    for node in newNodes:
+      timeStampNode = self.getTimeStampNode(node, nodeInfos[node])
+      if timeStampNode != None and not node in self.timeStampNodes:
+        timeStampNodes[node] = timeStampNode
+    for node in newNodes:
+      logger_client.info("Adding subscription for " + str(node.nodeid.Identifier))
+    failed = self.subscriptions.subscribe(list(nodes) + list(timeStampNodes.values()))
+    for node in newNodes:
+      if node in failed:
+        logger_client.warning("Failed to subscribe " + str(node.nodeid.Identifier))
+        continue
+      self.nodeInfos[node] = nodeInfos[node]
+      if node in timeStampNodes and not timeStampNodes[node] in failed:
+        logger_client.debug("Found time stamps for node: " + node.nodeid.Identifier)
+        self.timeStampNodes[node] = timeStampNodes[node]
+        self.handler.addTimeStampNode(node, timeStampNodes[node])
+      elif node in timeStampNodes:
+        logger_client.debug("No time stamps found for node: " + node.nodeid.Identifier)
+    self.updateDirectNodes()
+    return not any(node in failed for node in nodes)
+
+  def unsubscribe(self, nodes):
+    '''
+    Remove an observer from each of the given nodes. Nodes without observers and their time stamp nodes
+    are unsubscribed.
+    '''
+    if self.subscriptions == None or len(nodes) == 0:
+      return
+    # a time stamp node has one more observer as long as it is paired with its array node
+    paired = set(self.timeStampNodes.values())
+    removedNodes = [node for node in set(nodes) if self.subscriptions.getObservers(node) - (node in paired) <= nodes.count(node)]
+    timeStampNodes = [self.timeStampNodes.pop(node) for node in removedNodes if node in self.timeStampNodes]
+    for timeStampNode in timeStampNodes:
+      self.handler.removeTimeStampNode(timeStampNode)
+    for node in removedNodes:
+      logger_client.info("Removing subscription for " + str(node.nodeid.Identifier))
+      self.nodeInfos.pop(node, None)
+      self.histories.pop(node, None)
+    self.subscriptions.unsubscribe(list(nodes) + timeStampNodes)
+    self.updateDirectNodes()
+
+  def updateDirectNodes(self):
+    '''
+    Tell the handler which time stamp nodes are also shown directly, i.e. have more observers than the pairing.
+    '''
+    for timeStampNode in self.timeStampNodes.values():
+      self.handler.setDirect(timeStampNode, self.subscriptions.getObservers(timeStampNode) > 1)
+
+  def getTimeStampNode(self, node, nodeInfo):
+    '''
+    @param nodeInfo(NodeInfo): The metadata of the node. Only arrays have time stamp nodes.
+    @return The node holding the time stamps of the given array node or None if it is no array or the name does not fit.
+    '''
+    identifier = node.nodeid.Identifier
+    if nodeInfo.arrayLength == None or type(identifier) != str or not "Value" in identifier or "_timeStampsValue" in identifier:
+      return None
+    return self.uaclient.get_node(ua.NodeId(identifier.replace("Value","_timeStampsValue"), node.nodeid.NamespaceIndex))
+
+  def updateNode(self, node, value, timestamp, timeStamps = None):
     for p in self.plotManagers:
       if node == p.node:
-        p._update_subscription_model(node, value, timestamp)
+        p._update_subscription_model(node, value, timestamp, timeStamps)
         
     for p in self.tableManager.tableItems:
       if node == p[0]:
@@ -373,8 +637,17 @@ class MicroDAQviewer_live(QMainWindow, Ui_MainWindow):
     self.setupUi(self)
 
     self.handler = DataChangeHandler()
-    self.handler.fire.connect(self.updateNode, type=Qt.QueuedConnection)
-    self.nodes = []
+    self.subscriptions = None # SubscriptionManager, created on connect
+    self.subscriptionGroups = args.subscriptionGroups
+    self.maxItems = args.maxItems
+    self.historyDepth = args.historyDepth
+    self.histories = {}     # node -> RingBuffer holding the latest values of numeric scalars
+    self.timeStampNodes = {} # node -> subscribed node holding the time stamps of the array node
+    self.nodeInfos = {}     # node -> NodeInfo of subscribed nodes
+    # redraw with a fixed frame rate instead of on every data change
+    self.renderTimer = QTimer()
+    self.renderTimer.timeout.connect(self.render)
+    self.renderTimer.start(int(1000./max(args.frameRate, 0.1)))
     
     self.plotManagers = []
     global signal_counter
@@ -446,6 +719,23 @@ if __name__ == '__main__':
                       help='enable debug output')
   parser.add_argument('--nPlots', type=int, default = 1,
                     help='Set number of available plot slots')
+  parser.add_argument('--historyDepth', type=int, default = 10000,
+                    help='Number of values kept per scalar variable for the strip chart.')
+  parser.add_argument('--frameRate', type=float, default = 10.,
+                    help='Number of GUI updates per second. Data changes in between are collected and shown together.')
+  parser.add_argument('--publishingInterval', type=float, default = 500.,
+                    help='Publishing interval of the subscriptions in ms.')
+  parser.add_argument('--samplingInterval', type=float, default = -1.,
+                    help='Sampling interval of the monitored PVs in ms. 0 means as fast as possible, -1 means the publishing interval.')
+  parser.add_argument('--queueSize', type=int, default = 0,
+                    help='Server side queue size of the monitored PVs. Use values larger than 1 to receive all changes of PVs updated faster than the publishing interval.')
+  parser.add_argument('--subscriptionGroup', type=str, nargs=4, action='append', default=[],
+                    metavar=('PATTERN', 'PUBLISHING', 'SAMPLING', 'QUEUE'),
+                    help='Use separate subscriptions with the given publishing interval, sampling interval and queue size '
+                    'for PVs matching the pattern, e.g. "*DAQ*" 100 0 10. Can be given several times. '
+                    'The first matching group is used, PVs not matching any group use the default settings.')
+  parser.add_argument('--maxItems', type=int, default = 1000,
+                    help='Maximum number of PVs monitored by a single subscription.')
   
   args = parser.parse_args()
 
@@ -453,4 +743,9 @@ if __name__ == '__main__':
   logger_client.setLevel(logging.DEBUG) if args.debug else logger_client.setLevel(logging.INFO)
   if found_opcua == False:
     sys.exit("OPC UA module is not available on your system. Please install opcua-client via pip3!")
+  try:
+    args.subscriptionGroups = [SubscriptionGroup(g[0], float(g[1]), float(g[2]), int(g[3])) for g in args.subscriptionGroup]
+  except ValueError as e:
+    parser.error("Invalid subscription group: {}".format(e))
+  args.subscriptionGroups.append(SubscriptionGroup("*", args.publishingInterval, args.samplingInterval, args.queueSize))
   main(args)
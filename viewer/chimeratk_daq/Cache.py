@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import threading
+from collections import OrderedDict
+
+def nbytes(value):
+  '''
+  Size of a cached value in bytes. Tuples and lists are summed up, values without
+  the attribute nbytes (e.g. numpy arrays) are not counted.
+  '''
+  if isinstance(value, (tuple, list)):
+    return sum(nbytes(entry) for entry in value)
+  return getattr(value, "nbytes", 0)
+
+class LRUCache():
+  '''
+  Simple least recently used cache.
+  If the cache is full the entry that was not used for the longest time is removed.
+  The cache can be used from several threads.
+  @param maxSize(int): Maximum number of entries.
+  @param maxBytes(int): Maximum total size of the entries in bytes (see nbytes). None means no limit.
+  @param onEvict: Callable called with key and value of each entry removed from the cache.
+  '''
+  def __init__(self, maxSize, maxBytes = None, onEvict = None):
+    self.maxSize = maxSize
+    self.maxBytes = maxBytes
+    self.onEvict = onEvict
+    self.entries = OrderedDict()
+    self.sizes = {}
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    '''
+    @return The cached value or None if the key is not in the cache.
+    '''
+    with self.lock:
+      if not key in self.entries:
+        self.misses = self.misses + 1
+        return None
+      self.hits = self.hits + 1
+      self.entries.move_to_end(key)
+      return self.entries[key]
+
+  def put(self, key, value):
+    with self.lock:
+      self.bytes = self.bytes - self.sizes.pop(key, 0)
+      self.entries[key] = value
+      self.entries.move_to_end(key)
+      if self.maxBytes != None:
+        self.sizes[key] = nbytes(value)
+        self.bytes = self.bytes + self.sizes[key]
+      while len(self.entries) > self.maxSize or (self.maxBytes != None and self.bytes > self.maxBytes and len(self.entries) > 1):
+        (oldKey, oldValue) = self.entries.popitem(last=False)
+        self.bytes = self.bytes - self.sizes.pop(oldKey, 0)
+        if self.onEvict != None:
+          self.onEvict(oldKey, oldValue)
+
+  def clear(self):
+    with self.lock:
+      if self.onEvict != None:
+        for (key, value) in self.entries.items():
+          self.onEvict(key, value)
+      self.entries.clear()
+      self.sizes.clear()
+      self.bytes = 0
+
+  def getStatistics(self):
+    '''
+    @return String summarising the usage of the cache.
+    '''
+    total = self.hits + self.misses
+    return "{} entries, {:.1f} MB, {} hits, {} misses ({:.0f}% hit rate)".format(
+      len(self.entries), self.bytes/1024/1024, self.hits, self.misses, 100.*self.hits/total if total > 0 else 0.)
+
+  def __contains__(self, key):
+    return key in self.entries
+
+  def __len__(self):
+    return len(self.entries)
@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import json
+import logging
+import numpy as np
+from chimeratk_daq.EventIndex import EventIndex
+from chimeratk_daq.HDF5Extractor import readBlock, reduceBlock
+from chimeratk_daq.FilePool import FilePool
+
+MANIFEST = "manifest.json"
+VERSION = 1
+
+def convert(filenames, path, items = None, blockSize = 1024):
+  '''
+  Convert HDF5 DAQ files to a column store.
+  Every variable is written as one contiguous, uncompressed numpy (.npy) file: scalars as 1D arrays
+  with one entry per event and traces as 2D arrays (event x sample). Traces shorter than the first
+  trace are filled with nan, longer ones are truncated. Integer variables are stored as float64.
+  In addition the time stamps of all events are stored and a manifest (manifest.json) describing
+  the source files and the columns. The manifest is written last, so a store without manifest is incomplete.
+  @param filenames(list): The HDF5 files in the order the events should be stored.
+  @param path(string): The output directory.
+  @param items(list): Variable paths to be converted, e.g. /Probe/amp. None converts all variables of the first event.
+  @raise ValueError if one of the items is not stored in the first event.
+  '''
+  pool = FilePool()
+  indices = {}
+  files = []
+  timeStamps = []
+  groups = []
+  for filename in filenames:
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not directory in indices:
+      indices[directory] = EventIndex(directory)
+    (events, fileTimeStamps) = indices[directory].getEvents(filename, pool.use)
+    files.append({"name": os.path.basename(filename), "status": EventIndex.fileStatus(filename),
+                  "first": len(timeStamps), "nEvents": len(events)})
+    groups.extend(events)
+    timeStamps.extend(fileTimeStamps)
+  for index in indices.values():
+    index.save()
+  nEvents = len(timeStamps)
+  schema = indices[os.path.dirname(os.path.abspath(filenames[0]))].getSchema(filenames[0], pool.use)
+  if items == None:
+    items = sorted("/" + name for name in schema)
+  unknown = [item for item in items if not item.lstrip("/") in schema]
+  if len(unknown) > 0:
+    raise ValueError("Unknown variables: {}. Available variables: {}".format(", ".join(unknown),
+                     ", ".join(sorted("/" + name for name in schema))))
+  os.makedirs(path, exist_ok=True)
+  np.save(os.path.join(path, "timeStamps.npy"), np.asarray(timeStamps, dtype=np.float64))
+  columns = {}
+  for (i, item) in enumerate(items):
+    (shape, dtype) = schema[item.lstrip("/")]
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+      dtype = np.dtype(np.float64)
+    length = shape[0] if len(shape) > 0 else 1
+    columnShape = (nEvents,) if length == 1 else (nEvents, length)
+    columns[item] = {"file": "{:05d}.npy".format(i), "shape": list(columnShape), "dtype": dtype.str}
+    logging.info("Converting {} ({}/{})".format(item, i + 1, len(items)))
+    column = np.lib.format.open_memmap(os.path.join(path, columns[item]["file"]), mode='w+', dtype=dtype, shape=columnShape)
+    buffer = None
+    for (fileIndex, entry) in enumerate(files):
+      filename = filenames[fileIndex]
+      for first in range(entry["first"], entry["first"] + entry["nEvents"], blockSize):
+        last = min(first + blockSize, entry["first"] + entry["nEvents"])
+        (block, buffer, nBytes) = readBlock(pool.get(filename), groups[first:last], item, buffer)
+        if length == 1:
+          column[first:last] = block[:,0]
+        else:
+          n = min(length, block.shape[1])
+          column[first:last,:n] = block[:,:n]
+          column[first:last,n:] = np.nan
+    column.flush()
+    del column
+  pool.clear()
+  manifest = {"version": VERSION, "nEvents": nEvents, "files": files, "timeStamps": "timeStamps.npy", "columns": columns}
+  tmpFile = os.path.join(path, MANIFEST + ".tmp")
+  with open(tmpFile, 'w') as f:
+    json.dump(manifest, f)
+  os.replace(tmpFile, os.path.join(path, MANIFEST))
+
+class ColumnStore():
+  '''
+  Reader of a column store written by convert.
+  Columns are opened as memory mapped arrays, so only the pages of the requested events are read.
+  @param path(string): The directory of the column store.
+  @raise OSError or ValueError if the manifest can not be read.
+  '''
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, MANIFEST), 'r') as f:
+      self.manifest = json.load(f)
+    if self.manifest.get("version") != VERSION:
+      raise ValueError("Column store {} has wrong version.".format(path))
+    self.files = {entry["name"]: entry for entry in self.manifest["files"]}
+    self.columns = {}       # item -> memory mapped column
+
+  def __contains__(self, item):
+    return item in self.manifest["columns"]
+
+  def getColumn(self, item):
+    if not item in self.columns:
+      self.columns[item] = np.load(os.path.join(self.path, self.manifest["columns"][item]["file"]), mmap_mode='r')
+    return self.columns[item]
+
+  def mapEvents(self, filenames, nEvents):
+    '''
+    Get the position in the store of the events of the given files.
+    @param filenames(list): The HDF5 files in the order their events are numbered.
+    @param nEvents(list): The number of events of each file.
+    @return Array with the store position of each event or None if one of the files is not part
+            of the store or changed since the conversion.
+    '''
+    positions = []
+    for (filename, n) in zip(filenames, nEvents):
+      entry = self.files.get(os.path.basename(filename))
+      try:
+        if entry == None or tuple(entry["status"]) != EventIndex.fileStatus(filename) or entry["nEvents"] != n:
+          logging.info("File {} is not part of the column store or has changed.".format(filename))
+          return None
+      except OSError:
+        return None
+      positions.append(np.arange(entry["first"], entry["first"] + n))
+    return np.concatenate(positions) if len(positions) > 0 else np.empty(0, dtype=np.int64)
+
+  def collect(self, positions, item, arrayPos, blockSize = 4096):
+    '''
+    Collect one value per event.
+    @param positions(numpy.ndarray): The store positions of the events (see mapEvents).
+    @param arrayPos(int): The array position or reduction to be used (see reduceBlock).
+    @return Array with one value per event.
+    '''
+    column = self.getColumn(item)
+    if column.ndim == 1:
+      return np.asarray(column[positions], dtype=np.float64)
+    if arrayPos >= 0:
+      if arrayPos >= column.shape[1]:
+        logging.warning("Requested array position is too large. Will use maximum instead: {}".format(column.shape[1]-1))
+        arrayPos = column.shape[1]-1
+      return np.asarray(column[positions, arrayPos], dtype=np.float64)
+    result = np.empty(len(positions), dtype=np.float64)
+    for first in range(0, len(positions), blockSize):
+      last = min(first + blockSize, len(positions))
+      result[first:last] = reduceBlock(np.asarray(column[positions[first:last]], dtype=np.float64), arrayPos)
+    return result
+
+  def getTrace(self, position, item):
+    '''
+    @return Tuple of index array and data array of a single event.
+    '''
+    column = self.getColumn(item)
+    arr = np.asarray(column[position], dtype=np.float32).reshape(-1)
+    return (np.arange(len(arr)), arr)
@@ -0,0 +1,219 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import json
+import logging
+import datetime
+import h5py
+import numpy as np
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def toTimeStamp(toplevel):
+  '''
+  Convert an event group name to seconds since EPOCH (local time).
+  @param toplevel(string): The group name, e.g. 2020-01-01 00:00:00.12
+  @return The time stamp or nan if the name is not a valid time stamp.
+  '''
+  try:
+    return datetime.datetime.strptime(toplevel.strip('/'), TIME_FORMAT).timestamp()
+  except ValueError:
+    return float('nan')
+
+def localOffset(seconds):
+  '''
+  Get the offset between local time and UTC.
+  @param seconds(float): Local wall clock time given as seconds since EPOCH.
+  @return The offset in seconds that has to be subtracted to get the time stamp.
+  '''
+  wallTime = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=seconds)
+  return seconds - wallTime.timestamp()
+
+def toTimeStamps(toplevels):
+  '''
+  Convert a list of event group names to seconds since EPOCH (local time).
+  The conversion is done vectorized using numpy.datetime64. The local time offset is
+  evaluated once per hour contained in the list, which covers daylight saving time changes.
+  @param toplevels(list): The group names, e.g. 2020-01-01 00:00:00.12
+  @return numpy.ndarray of float64 time stamps.
+  '''
+  if len(toplevels) == 0:
+    return np.empty(0, dtype=np.float64)
+  try:
+    t = np.array([toplevel.strip('/') for toplevel in toplevels], dtype='datetime64[us]')
+  except ValueError:
+    logging.debug("Found event names that are no time stamps.")
+    return np.array([toTimeStamp(toplevel) for toplevel in toplevels], dtype=np.float64)
+  wallTime = (t - np.datetime64(0, 'us')).astype(np.float64)*1e-6
+  (hours, inverse) = np.unique(np.floor(wallTime/3600.), return_inverse=True)
+  offsets = np.array([localOffset(hour*3600.) for hour in hours])
+  return wallTime - offsets[inverse]
+
+def isSorted(timeStamps):
+  '''
+  @return True if the given time stamps are not decreasing.
+  '''
+  return bool(np.all(np.diff(timeStamps) >= 0))
+
+def findEventRange(timeStamps, tStart, tEnd):
+  '''
+  Find the events covering the given time range using a binary search.
+  @param timeStamps(numpy.ndarray): Sorted time stamps of all events.
+  @param tStart(float): Start of the time range in seconds since EPOCH.
+  @param tEnd(float): End of the time range in seconds since EPOCH.
+  @return Tuple of the last event before tStart and the first event at or after tEnd.
+          Both are limited to the available events.
+  '''
+  first = np.searchsorted(timeStamps, tStart, side='left') - 1
+  last = np.searchsorted(timeStamps, tEnd, side='left')
+  return (int(max(first, 0)), int(min(last, len(timeStamps) - 1)))
+
+class EventIndex():
+  '''
+  Persistent index of the events stored in the HDF5 files of a DAQ directory.
+  For every file the modification time, the size, the event group names and the
+  corresponding time stamps are stored in a sidecar file in the DAQ directory.
+  Optionally the variables of the first event (the schema, see getSchema) are stored as well.
+  Only files that changed since the index was written are scanned again.
+  @param path(string): The DAQ directory.
+  '''
+  fileName = ".uDAQ_index.json"
+  version = 1
+
+  def __init__(self, path):
+    self.path = path
+    self.entries = {}       # file name -> dict(status, events, timeStamps[, schema])
+    self.firstEvents = {}   # file name -> dict(status, event) for files without full entry (see getFirstEvent)
+    self.modified = False
+    self.load()
+
+  def getIndexFile(self):
+    return os.path.join(self.path, EventIndex.fileName)
+
+  def load(self):
+    '''
+    Read the index file. If it does not exist or is not readable an empty index is used.
+    '''
+    try:
+      with open(self.getIndexFile(), 'r') as f:
+        content = json.load(f)
+      if content.get("version") != EventIndex.version:
+        logging.info("Event index has wrong version. It will be rebuilt.")
+        return
+      self.entries = content["files"]
+      self.firstEvents = content.get("firstEvents", {})
+      logging.debug("Loaded event index with {} files.".format(len(self.entries)))
+    except FileNotFoundError:
+      logging.debug("No event index found in " + self.path)
+    except (OSError, ValueError, KeyError) as e:
+      logging.warning("Failed to read event index {}: {}".format(self.getIndexFile(), e))
+
+  def save(self):
+    '''
+    Write the index file if it was modified. The file is replaced atomically.
+    If the DAQ directory is not writable the index is only kept in memory.
+    '''
+    if not self.modified:
+      return
+    tmpFile = self.getIndexFile() + ".tmp"
+    try:
+      with open(tmpFile, 'w') as f:
+        json.dump({"version": EventIndex.version, "files": self.entries, "firstEvents": self.firstEvents}, f)
+      os.replace(tmpFile, self.getIndexFile())
+      self.modified = False
+      logging.debug("Event index written to " + self.getIndexFile())
+    except OSError as e:
+      logging.warning("Failed to write event index {}: {}".format(self.getIndexFile(), e))
+
+  @staticmethod
+  def fileStatus(filename):
+    s = os.stat(filename)
+    return (s.st_mtime_ns, s.st_size)
+
+  def isValid(self, filename):
+    '''
+    @return True if the index entry of the given file is up to date.
+    '''
+    entry = self.entries.get(os.path.basename(filename))
+    if entry == None:
+      return False
+    try:
+      return tuple(entry["status"]) == EventIndex.fileStatus(filename)
+    except OSError:
+      return False
+
+  def getFirstEvent(self, filename):
+    '''
+    Get the name of the first event group of a file, which is used to sort files by time.
+    It is taken from the index if possible. Else only the first group name is read from the file.
+    @param filename(string): The HDF5 file name.
+    @return The name of the first event or an empty string if the file has no events or can not be read.
+    '''
+    name = os.path.basename(filename)
+    if self.isValid(filename):
+      events = self.entries[name]["events"]
+      return events[0] if len(events) > 0 else ""
+    try:
+      status = EventIndex.fileStatus(filename)
+    except OSError:
+      return ""
+    entry = self.firstEvents.get(name)
+    if entry != None and tuple(entry["status"]) == status:
+      return entry["event"]
+    try:
+      with h5py.File(filename, 'r') as h5file:
+        event = next(iter(h5file), "")
+    except OSError as e:
+      logging.warning("Failed to read first event of file {}: {}".format(filename, e))
+      return ""
+    self.firstEvents[name] = {"status": status, "event": event}
+    self.modified = True
+    return event
+
+  def getEvents(self, filename, openFile):
+    '''
+    Get the event group names and time stamps of an HDF5 file.
+    If the index entry is outdated the file is scanned and the index is updated.
+    @param filename(string): The HDF5 file name.
+    @param openFile: Callable returning a context manager providing the opened h5py.File for a file name,
+                     e.g. FilePool.use. Only called if the file needs to be scanned.
+    @return Tuple of the list of event group names and the list of time stamps.
+    @raise OSError if the file needs to be scanned and can not be opened.
+    '''
+    if not self.isValid(filename):
+      logging.debug("Updating event index for file " + filename)
+      with openFile(filename) as theFile:
+        events = list(theFile)
+      self.entries[os.path.basename(filename)] = {
+        "status": EventIndex.fileStatus(filename),
+        "events": events,
+        "timeStamps": toTimeStamps(events).tolist()}
+      self.modified = True
+    entry = self.entries[os.path.basename(filename)]
+    return (entry["events"], entry["timeStamps"])
+
+  def getSchema(self, filename, openFile):
+    '''
+    Get the variables stored in the first event of an HDF5 file.
+    The schema is stored in the index, so the file is only scanned if it changed.
+    @param filename(string): The HDF5 file name.
+    @param openFile: Callable returning a context manager providing the opened h5py.File (see getEvents).
+    @return Dictionary of the dataset paths relative to the event group (e.g. Probe/amp) to
+            pairs of the shape (list) and the numpy type string (e.g. '<f4').
+    '''
+    entry = self.entries.get(os.path.basename(filename))
+    if entry == None or not self.isValid(filename):
+      self.getEvents(filename, openFile)
+      entry = self.entries[os.path.basename(filename)]
+    if not "schema" in entry:
+      logging.debug("Reading variables of file " + filename)
+      schema = {}
+      if len(entry["events"]) > 0:
+        def addDataset(name, obj):
+          if hasattr(obj, "shape"):
+            schema[name] = (list(obj.shape), obj.dtype.str)
+        with openFile(filename) as theFile:
+          theFile[entry["events"][0]].visititems(addDataset)
+      entry["schema"] = schema
+      self.modified = True
+    return entry["schema"]
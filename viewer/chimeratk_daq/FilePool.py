@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+import threading
+from contextlib import contextmanager
+import h5py
+from chimeratk_daq.Cache import LRUCache
+
+class FilePool():
+  '''
+  Pool of opened HDF5 files.
+  At most maxOpenFiles files are kept open. If another file is requested the file that was
+  not used for the longest time is closed. Closed files are opened again on demand.
+  Thus the number of file descriptors and HDF5 metadata caches does not grow with the number of files.
+  Files used by several threads have to be accessed via use, which pins the file while it is used.
+  A pinned file removed from the pool is only closed once it is released.
+  @param maxOpenFiles(int): Maximum number of open files.
+  @param fileOptions(dict): Additional arguments for h5py.File, e.g. rdcc_nbytes and rdcc_nslots to
+                            configure the chunk cache.
+  '''
+  def __init__(self, maxOpenFiles = 64, fileOptions = None):
+    self.fileOptions = fileOptions or {}
+    self.files = LRUCache(maxSize = max(maxOpenFiles, 1), onEvict = self.evict)
+    self.lock = threading.RLock()
+    self.users = {}         # file name -> number of users of the file (see use)
+    self.evicted = {}       # file name -> file removed from the pool that is still in use
+    self.nOpened = 0
+
+  def get(self, filename):
+    '''
+    Get a file without pinning it. Only use this if no other thread uses the pool.
+    @return The opened h5py.File.
+    @raise OSError if the file can not be opened.
+    '''
+    with self.lock:
+      theFile = self.files.get(filename)
+      if theFile is None:
+        # a file still in use is put back instead of being opened a second time
+        theFile = self.evicted.pop(filename, None)
+        if theFile is None:
+          theFile = h5py.File(filename, 'r', **self.fileOptions)
+          self.nOpened = self.nOpened + 1
+        self.files.put(filename, theFile)
+      return theFile
+
+  @contextmanager
+  def use(self, filename):
+    '''
+    Context manager providing the opened h5py.File. The file is not closed while it is used.
+    @raise OSError if the file can not be opened.
+    '''
+    with self.lock:
+      theFile = self.get(filename)
+      self.users[filename] = self.users.get(filename, 0) + 1
+    try:
+      yield theFile
+    finally:
+      with self.lock:
+        self.users[filename] = self.users[filename] - 1
+        if self.users[filename] == 0:
+          del self.users[filename]
+          if filename in self.evicted:
+            FilePool.close(filename, self.evicted.pop(filename))
+
+  def evict(self, filename, theFile):
+    '''
+    Called with the lock held if a file is removed from the pool.
+    '''
+    if filename in self.users:
+      self.evicted[filename] = theFile
+    else:
+      FilePool.close(filename, theFile)
+
+  @staticmethod
+  def close(filename, theFile):
+    logging.debug("Closing file " + filename)
+    theFile.close()
+
+  def clear(self):
+    with self.lock:
+      self.files.clear()
+
+  def getStatistics(self):
+    return "{} open files, {} files opened in total".format(len(self.files) + len(self.evicted), self.nOpened)
@@ -0,0 +1,399 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import h5py
+import numpy as np
+
+def reduceBlock(block, arrayPos):
+  '''
+  Reduce a block of events to one value per event.
+  @param block(numpy.ndarray): 2D array with one row per event. Scalars are stored as rows of length 1.
+  @param arrayPos(int): The array position to be used. If < 0 special values are calculated:
+                        -1 (mean), -2 (max), -3 (min)
+  @return 1D array with one value per event.
+  '''
+  if block.shape[1] == 1:
+    # scalar
+    return block[:,0]
+  if arrayPos >= 0:
+    if arrayPos >= block.shape[1]:
+      logging.warning("Requested array position is too large. Will use maximum instead: {}".format(block.shape[1]-1))
+      arrayPos = block.shape[1]-1
+    return block[:,arrayPos]
+  elif arrayPos == -1:
+    return np.nanmean(block, axis=1)
+  elif arrayPos == -2:
+    return np.nanmax(block, axis=1)
+  elif arrayPos == -3:
+    return np.nanmin(block, axis=1)
+  else:
+    raise ValueError("Unknown array position: {}".format(arrayPos))
+
+def evaluateBlock(block, operator, threshold, arrayPos):
+  '''
+  Evaluate a trigger condition for a block of events.
+  @param block(numpy.ndarray): 2D array with one row per event (see readBlock).
+  @param operator(string): The trigger operator (<, >, =).
+  @param threshold(float): The trigger threshold.
+  @param arrayPos(int): The array position or reduction to be used (see reduceBlock).
+                        In addition -4 can be used to trigger if any element fulfills the condition.
+  @return Boolean array with one entry per event.
+  '''
+  if arrayPos == -4:
+    values = block
+  else:
+    values = reduceBlock(block, arrayPos)
+  if operator == ">":
+    result = values > threshold
+  elif operator == "<":
+    result = values < threshold
+  elif operator == "=":
+    result = values == threshold
+  else:
+    raise TypeError("Unknown operator set: " + operator)
+  if arrayPos == -4:
+    result = result.any(axis=1)
+  return result
+
+def readBlock(theFile, groups, item, buffer = None, arrayPos = -1, clamped = None):
+  '''
+  Read an item for a list of events of one file into a 2D array.
+  @param theFile(h5py.File): The file containing the events.
+  @param groups(list): The event group names.
+  @param item(string): The item path inside the event group, e.g. /Probe/amplitude
+  @param buffer(numpy.ndarray): Array to be reused for reading. It is only used if the shape fits.
+  @param arrayPos(int): If >= 0 only this element of each trace is read from the file (hyperslab selection)
+                        and the block has a single column. Else complete traces are read.
+  @param clamped(set): If given, (item, maximum array position) is added instead of logging a warning if
+                       arrayPos is too large, so the caller can report it once (see Extractor.logClamped).
+  @return Tuple of the 2D array with one row per event, the buffer it is a view of and the number of
+          bytes read from the file. If traces of different length are read, missing elements are filled with nan.
+  '''
+  datasets = [theFile[group + item] for group in groups]
+  length = max(ds.shape[0] for ds in datasets)
+  selection = None
+  if arrayPos >= 0 and length > 1:
+    if arrayPos >= length:
+      if clamped is None:
+        logging.warning("Requested array position is too large. Will use maximum instead: {}".format(length-1))
+      else:
+        clamped.add((item, length-1))
+      arrayPos = length-1
+    selection = np.s_[arrayPos:arrayPos+1]
+    length = 1
+  if buffer is None or buffer.shape[1] != length or buffer.shape[0] < len(datasets):
+    buffer = np.empty((len(datasets), length), dtype=np.float64)
+  block = buffer[:len(datasets)]
+  nBytes = 0
+  for (row, ds) in enumerate(datasets):
+    if selection != None:
+      if ds.shape[0] > arrayPos:
+        ds.read_direct(block[row], source_sel=selection)
+        nBytes = nBytes + ds.dtype.itemsize
+      else:
+        block[row] = np.nan
+    elif ds.shape[0] == length:
+      ds.read_direct(block[row])
+      nBytes = nBytes + ds.size*ds.dtype.itemsize
+    else:
+      block[row,:ds.shape[0]] = ds[()]
+      block[row,ds.shape[0]:] = np.nan
+      nBytes = nBytes + ds.size*ds.dtype.itemsize
+  return (block, buffer, nBytes)
+
+def collectFile(filename, groups, items, arrayPos, blockSize = 1024, fileOptions = None):
+  '''
+  Collect one value per event for several items from a single file.
+  This is executed in the worker processes of the parallel data collection. Each process
+  opens the file on its own.
+  @param filename(string): The HDF5 file name.
+  @param groups(list): The event group names.
+  @param items(list): The item paths inside the event group.
+  @param arrayPos(int): The array position or reduction to be used (see reduceBlock).
+  @param fileOptions(dict): Additional arguments for h5py.File, e.g. the chunk cache settings.
+  @return Tuple of a dictionary holding an array with one value per event for each item,
+          the number of bytes read from the file and the set of clamped array positions (see readBlock).
+  '''
+  clamped = set()
+  with h5py.File(filename, 'r', **(fileOptions or {})) as theFile:
+    (result, nBytes) = readItems(theFile, groups, items, arrayPos, blockSize, clamped)
+  return (result, nBytes, clamped)
+
+def readItems(theFile, groups, items, arrayPos, blockSize = 1024, clamped = None):
+  '''
+  Collect one value per event for several items from an opened file (see collectFile).
+  @param theFile(h5py.File): The opened file.
+  @param clamped(set): See readBlock.
+  @return Tuple of a dictionary holding an array with one value per event for each item and
+          the number of bytes read from the file.
+  '''
+  result = {}
+  buffer = None
+  nBytes = 0
+  for item in items:
+    y = np.empty(len(groups), dtype=np.float64)
+    for first in range(0, len(groups), blockSize):
+      last = min(first + blockSize, len(groups))
+      (block, buffer, blockBytes) = readBlock(theFile, groups[first:last], item, buffer, arrayPos, clamped)
+      y[first:last] = reduceBlock(block, arrayPos)
+      nBytes = nBytes + blockBytes
+    result[item] = y
+  return (result, nBytes)
+
+class Extractor():
+  '''
+  Columnar data extraction used by the HDF5 worker.
+  Instead of looping over events and items an item is gathered for a whole event range at once.
+  Events are grouped by file and read in blocks into preallocated arrays. Array reductions
+  (mean, max, min, index) are done for the whole block.
+  @param worker(chimeratk_daq.HDF5Worker.worker): The worker providing the files and the event list.
+  @param blockSize(int): Maximum number of events read into one block.
+  @param nProcesses(int): Number of processes used for data collection. If > 1 the events are
+                          partitioned by file and each file is read by a separate process.
+  '''
+  def __init__(self, worker, blockSize = 1024, nProcesses = 1):
+    self.worker = worker
+    self.blockSize = blockSize
+    self.nProcesses = nProcesses
+    self.pool = None        # process pool used for parallel collection, created on first use
+    self.progress = None    # callable(fraction) called after each block
+    self.partial = None     # callable(data, nFilled) called when more leading events are collected (see collectItems)
+    self.buffer = None      # block buffer reused between blocks
+    self.bytesRead = 0      # number of bytes read from the files, see resetStatistics
+    self.clamped = set()    # (item, maximum array position) of items read with too large array position
+
+  def resetStatistics(self):
+    '''
+    Reset the number of bytes read and the clamped array positions. The worker calls this at the beginning of each request.
+    '''
+    self.bytesRead = 0
+    self.clamped = set()
+
+  def logClamped(self):
+    '''
+    Warn once about all items read with a too large array position since the last call.
+    '''
+    for (item, maxPos) in sorted(self.clamped):
+      logging.warning("Requested array position is too large for {}. Will use maximum instead: {}".format(item, maxPos))
+    self.clamped = set()
+
+  def read(self, fileIndex, groups, item, buffer, arrayPos = -1):
+    '''
+    Read a block of events from an opened file (see readBlock) and count the bytes read.
+    @return Tuple of block and buffer.
+    '''
+    with self.worker.getFile(fileIndex) as theFile:
+      (block, buffer, nBytes) = readBlock(theFile, groups, item, buffer, arrayPos, self.clamped)
+    self.bytesRead = self.bytesRead + nBytes
+    return (block, buffer)
+
+  def segments(self, events):
+    '''
+    Split the given events into blocks of events stored in the same file.
+    @param events(numpy.ndarray): Event numbers.
+    @return Generator of (first, last, fileIndex) where first and last refer to positions in events.
+    '''
+    fileIndices = self.worker.fileIndices[events]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(fileIndices)) + 1, [len(events)]))
+    for (first, last) in zip(bounds[:-1], bounds[1:]):
+      for start in range(first, last, self.blockSize):
+        yield (start, min(start + self.blockSize, last), fileIndices[first])
+
+  def collect(self, events, item, arrayPos):
+    '''
+    Collect one value per event for the given item (see collectItems).
+    '''
+    return self.collectItems(events, [item], arrayPos)[item]
+
+  def collectItems(self, events, items, arrayPos):
+    '''
+    Collect one value per event for several items.
+    Blocks of events are read for all items before moving to the next block. Thus the leading
+    events are complete for all items and can be shown while the collection is running (see partial).
+    If more than one process is configured and the events are spread over several files
+    the collection is done in parallel (see collectParallel).
+    @param events(numpy.ndarray): Event numbers.
+    @param items(list): The item paths inside the event group.
+    @param arrayPos(int): The array position or reduction to be used (see reduceBlock).
+    @return Dictionary holding an array with one value per event for each item. If the worker
+            was stopped the arrays only contain the events processed so far. Events of files that
+            can not be read are set to nan.
+    '''
+    if self.nProcesses > 1 and len(np.unique(self.worker.fileIndices[events])) > 1:
+      return self.collectParallel(events, items, arrayPos)
+    data = {item: np.empty(len(events), dtype=np.float64) for item in items}
+    buffers = {}
+    for (first, last, fileIndex) in self.segments(events):
+      if self.worker.stop:
+        logging.info("Event loop was stopped by the user.")
+        self.logClamped()
+        return {item: data[item][:first] for item in items}
+      groups = [self.worker.eventList[event][1] for event in events[first:last]]
+      for item in items:
+        try:
+          (block, buffers[item]) = self.read(fileIndex, groups, item, buffers.get(item), arrayPos)
+          data[item][first:last] = reduceBlock(block, arrayPos)
+        except Exception as e:
+          logging.warning("Failed to read {} from file {}: {}".format(item, self.worker.filenames[fileIndex], e))
+          data[item][first:last] = np.nan
+      if self.partial != None:
+        self.partial(data, last)
+      if self.progress != None:
+        self.progress(1.*last/len(events))
+    self.logClamped()
+    return data
+
+  def getPool(self):
+    if self.pool == None:
+      # use spawn since forking a process that runs Qt and HDF5 threads is not safe
+      self.pool = ProcessPoolExecutor(max_workers=self.nProcesses, mp_context=multiprocessing.get_context('spawn'))
+    return self.pool
+
+  def shutdown(self, wait = True):
+    '''
+    Shut down the process pool. A new pool is created on the next use.
+    @param wait(bool): If True wait until the processes finished the files already started.
+    '''
+    if self.pool != None:
+      self.pool.shutdown(wait=wait)
+      self.pool = None
+
+  def submit(self, events, items, arrayPos, bounds):
+    '''
+    Submit the reading of each file to the process pool (see collectParallel). A broken pool, e.g. because
+    one of its processes was killed, is replaced by a new one.
+    @return Dictionary of future -> (first, last) positions in events.
+    '''
+    fileIndices = self.worker.fileIndices[events]
+    for attempt in range(2):
+      pool = self.getPool()
+      futures = {}
+      try:
+        for (first, last) in zip(bounds[:-1], bounds[1:]):
+          groups = [self.worker.eventList[event][1] for event in events[first:last]]
+          filename = self.worker.filenames[fileIndices[first]]
+          futures[pool.submit(collectFile, filename, groups, list(items), arrayPos, self.blockSize, self.worker.fileOptions)] = (first, last)
+        return futures
+      except BrokenProcessPool:
+        logging.warning("Process pool is broken. Creating a new one.")
+        self.shutdown(wait=False)
+    raise BrokenProcessPool("Failed to create a working process pool.")
+
+  def collectParallel(self, events, items, arrayPos):
+    '''
+    Collect one value per event for several items using a pool of processes.
+    The events are partitioned by file and every file is read by one process. Results are
+    merged in event order as they come back. Files not processed yet are cancelled if the worker is stopped.
+    @return Dictionary holding an array with one value per event for each item. If the worker
+            was stopped the arrays only contain the leading events that were completely processed.
+            Events of files that can not be read are set to nan (see collectItems).
+    '''
+    fileIndices = self.worker.fileIndices[events]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(fileIndices)) + 1, [len(events)]))
+    data = {item: np.empty(len(events), dtype=np.float64) for item in items}
+    futures = self.submit(events, items, arrayPos, bounds)
+    broken = False       # True if a process of the pool died
+    logging.debug("Submitted {} files to {} processes.".format(len(futures), self.nProcesses))
+    done = {}            # first event position -> last event position of merged segments
+    nFilled = 0          # number of leading events merged so far
+    nProcessed = 0
+    pending = set(futures)
+    while len(pending) > 0:
+      # wake up regularly to check the stop flag
+      (completed, pending) = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+      if self.worker.stop:
+        logging.info("Event loop was stopped by the user.")
+        # files already read by a process can not be cancelled, but their results are ignored
+        for future in pending:
+          future.cancel()
+        break
+      for future in completed:
+        (first, last) = futures[future]
+        try:
+          (result, nBytes, clamped) = future.result()
+          self.bytesRead = self.bytesRead + nBytes
+          self.clamped.update(clamped)
+          for item in items:
+            data[item][first:last] = result[item]
+        except Exception as e:
+          logging.warning("Failed to read file {}: {}".format(self.worker.filenames[fileIndices[first]], repr(e)))
+          broken = broken or isinstance(e, BrokenProcessPool)
+          for item in items:
+            data[item][first:last] = np.nan
+        done[first] = last
+        nProcessed = nProcessed + last - first
+      if nFilled in done:
+        while nFilled in done:
+          nFilled = done.pop(nFilled)
+        if self.partial != None:
+          self.partial(data, nFilled)
+      if self.progress != None:
+        self.progress(1.*nProcessed/len(events))
+    if broken:
+      # the pool can not be used anymore -> the next request creates a new one
+      self.shutdown(wait=False)
+    self.logClamped()
+    if nFilled < len(events):
+      data = {item: data[item][:nFilled] for item in items}
+    return data
+
+  def evaluate(self, events, item, condition, arrayPos = -1):
+    '''
+    Evaluate a condition for all given events.
+    @param events(numpy.ndarray): Event numbers.
+    @param item(string): The item path inside the event group.
+    @param condition(callable): Gets a block (see readBlock) and returns a boolean array with one entry per row.
+    @param arrayPos(int): If >= 0 only this array element is read (see readBlock).
+    @return Boolean array with one entry per event or None if the worker was stopped.
+    '''
+    result = np.zeros(len(events), dtype=bool)
+    for (first, last, fileIndex) in self.segments(events):
+      if self.worker.stop:
+        logging.info("Event loop was stopped by the user.")
+        return None
+      groups = [self.worker.eventList[event][1] for event in events[first:last]]
+      (block, self.buffer) = self.read(fileIndex, groups, item, self.buffer, arrayPos)
+      result[first:last] = condition(block)
+      if self.progress != None:
+        self.progress(1.*last/len(events))
+    self.logClamped()
+    return result
+
+  def find(self, events, item, condition, arrayPos = -1):
+    '''
+    Find the first event fulfilling a condition. Events are tested block-wise in the given order.
+    @param events(numpy.ndarray): Event numbers in the order to be tested.
+    @param item(string): The item path inside the event group.
+    @param condition(callable): Gets a block (see readBlock) and returns a boolean array with one entry per row.
+    @param arrayPos(int): If >= 0 only this array element is read (see readBlock).
+    @return The position of the first matching event in events or -1 if no event matches or the worker was stopped.
+    '''
+    for (first, last, fileIndex) in self.segments(events):
+      if self.worker.stop:
+        logging.info("Event loop was stopped by the user.")
+        return -1
+      groups = [self.worker.eventList[event][1] for event in events[first:last]]
+      (block, self.buffer) = self.read(fileIndex, groups, item, self.buffer, arrayPos)
+      matches = np.flatnonzero(condition(block))
+      if len(matches) > 0:
+        self.logClamped()
+        return first + int(matches[0])
+      if self.progress != None:
+        self.progress(1.*last/len(events))
+    self.logClamped()
+    return -1
+
+  def collectTrace(self, event, item):
+    '''
+    Read the trace of a single event.
+    @return Tuple of index array and data array.
+    '''
+    (fileIndex, toplevel) = self.worker.eventList[event]
+    with self.worker.getFile(fileIndex) as theFile:
+      dataset = theFile[toplevel + item]
+      arr = np.asarray(dataset, dtype=np.float32)
+      self.bytesRead = self.bytesRead + dataset.size*dataset.dtype.itemsize
+    return (np.arange(len(arr)), arr)
@@ -19,7 +19,11 @@ import pyqtgraph as pg
 import h5py
 from chimeratk_daq.MicroDAQviewerUI import Ui_MainWindow
 from chimeratk_daq.HDF5Worker import worker
-from chimeratk_daq.TimeXAxis import DateAxisItem
+from chimeratk_daq.TimeXAxis import DateAxisItem, getDateString
+from chimeratk_daq.EventIndex import findEventRange
+from chimeratk_daq.LevelOfDetail import CurveLOD
+from chimeratk_daq.Scheduler import RequestScheduler
+from chimeratk_daq.VariableTree import VariableTree
 
 def dragEnterEventGraph(ev):
   ev.acceptProposedAction()
@@ -58,6 +62,11 @@ class TableManager():
       item = QtWidgets.QTableWidgetItem()
       if len(data[parameter[0]][0]) == 1:
         item.setText(str(data[parameter[0]][1][0]))
+      elif parameter[0] in self.app.worker.summarized:
+        # the data holds minimum and maximum per time bucket -> use the statistics of all events
+        summarized = self.app.worker.summarized[parameter[0]]
+        item.setForeground(QtGui.QBrush(QtGui.QColor("#48ba0b")))
+        item.setText("µ="+"%.3f" % summarized["mean"] + " σ=" + "%.3f" % summarized["std"] + " (summary)")
       else:
         item.setForeground(QtGui.QBrush(QtGui.QColor("#48ba0b")))
         item.setText("µ="+"%.3f" % data[parameter[0]][1].mean() + " σ=" + "%.3f" % data[parameter[0]][1].std())
@@ -80,6 +89,8 @@ class PlotManager():
     self.plot.dragEnterEvent = dragEnterEventGraph
     self.plot.dragMoveEvent = dragMoveEventGraph
     self.plotItems = []
+    self.lod = CurveLOD(self.plot)
+    self.curves = {}     # plot item -> curve shown in the plot
     self.axis = DateAxisItem(plotItem=self.plot.getPlotItem(), orientation='bottom')
     self.axis.hide()
     
@@ -101,10 +112,26 @@ class PlotManager():
     ev.accept()
     self.putGraph()
       
+  def appendPlot(self, data):
+    '''
+    Show the data collected so far while the worker is still running.
+    The data of existing curves is replaced by the longer data. Curves are only created
+    if the plot does not show all items yet.
+    '''
+    if len(self.plotItems) == 0 or any(not item in data for item in self.plotItems):
+      return
+    if any(not item in self.curves for item in self.plotItems):
+      self.updatePlot(data)
+      return
+    for item in self.plotItems:
+      self.lod.setData(self.curves[item], data[item][0],data[item][1])
+
   def updatePlot(self, data):
     # reset the plot and remove legend and title
     self.plot.clear()
+    self.lod.clear()
     self.plot.setTitle("")
+    self.curves = {}
     # add legend if multiple plot entries are present - will stay also if later only one plot is added
     if self.legend == None and len(self.plotItems) > 1:
       self.legend = self.plot.addLegend()
@@ -114,18 +141,22 @@ class PlotManager():
       self.app.setStatusBarMsg("Updating" + item + " data..." )
       myPen = pg.mkPen(penIndex,len(self.plotItems))
       penIndex = penIndex + 1
+      name = item
+      if item in self.app.worker.summarized:
+        name = "{} (summary: min/max per {:g} s)".format(item, self.app.worker.summarized[item]["resolution"])
       if len(self.plotItems) == 1:
-        self.plot.setTitle(item)
+        self.plot.setTitle(name)
       if self.app.chainCombo.currentIndex() == 0 and len(data[item][0]) > 1:
         self.setup(False)
       else:
         self.setup(True)
       if(len(data[item][0]) == 1):
-        curve = self.plot.plot(pen=myPen, name=item, symbol='o')
+        curve = self.plot.plot(pen=myPen, name=name, symbol='o')
       else:
-        curve = self.plot.plot(pen=myPen, name=item)
+        curve = self.plot.plot(pen=myPen, name=name)
 #       logging.debug("Data length: {}, Data-x: {}, Data-y: {}".format(len(data[item][0]),data[item][0],data[item][1]))
-      curve.setData(data[item][0],data[item][1])
+      self.lod.setData(curve, data[item][0],data[item][1])
+      self.curves[item] = curve
       self.app.setStatusBarMsg("")
 
 
@@ -152,9 +183,11 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     
     # update status bar
     if self.chainCombo.currentIndex() == 0:
-      # find corresponding top-level directory name
-      timesString = self.worker.getTimeString(event)
-      self.setStatusBarMsg(timesString)
+      timeStamp = self.worker.getTimeStamp(event)
+      if timeStamp == None:
+        self.setStatusBarMsg(self.worker.getTimeString(event))
+      else:
+        self.setStatusBarMsg(getDateString(timeStamp))
       self.tableWidget.setToolTip("For arrays the mean and standard deviation is shown")
     elif self.chainCombo.currentIndex() == 1:
       self.setStatusBarMsg("Event cluster: " + str(event) + "/" +  str(math.ceil(self.nEvents/self.spinChainEvents.value())-1))
@@ -163,33 +196,24 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     
   def sliderMoved(self):
     # obtain new event number
-    if not self.worker.isRunning():
-      self.spinEvent.setValue(self.horizontalSlider.value())
-    else:
-      logging.debug("Worker is busy.")
+    self.spinEvent.setValue(self.horizontalSlider.value())
 
-  def buildVariableTree(self, parentFileItem, parentTreeItem, path):
-    # iterate over sub-items
-    for name in parentFileItem:
-    
-      newPath = path + "/" + name
-      # print("adding item: "+ newPath)
-    
-      # create tree item
-      entry = QtWidgets.QTreeWidgetItem(parentTreeItem)
-      entry.setText(0, name)
-      entry.setData(0, QtCore.Qt.UserRole, newPath)
-      
-      
-      # recurse into sub-items, if class is group
-      if parentFileItem.get(name, getclass=True) == h5py._hl.group.Group:
-        self.buildVariableTree(parentFileItem[name], entry, newPath)
-      else:
-        #check if array and choose different text color
-        if(parentFileItem.get(name).shape[0] == 1):
-          entry.setForeground(0,QtGui.QBrush(QtGui.QColor("#0a3cba"))) #blue
-        else:
-          entry.setForeground(0,QtGui.QBrush(QtGui.QColor("#48ba0b"))) #green
+  def buildVariableTree(self):
+    '''
+    Fill the variable tree from the schema of the first event. Children are added when a group is expanded.
+    A filter line edit is added above the tree.
+    '''
+    self.treeFilter = QtWidgets.QLineEdit()
+    self.treeFilter.setPlaceholderText("Filter variables...")
+    self.treeFilter.setClearButtonEnabled(True)
+    container = QtWidgets.QWidget()
+    layout = QtWidgets.QVBoxLayout(container)
+    layout.setContentsMargins(0, 0, 0, 0)
+    self.splitter_4.insertWidget(self.splitter_4.indexOf(self.treeWidget), container)
+    layout.addWidget(self.treeFilter)
+    layout.addWidget(self.treeWidget)
+    self.variableTree = VariableTree(self.treeWidget, self.worker.getSchema())
+    self.treeFilter.textChanged.connect(self.variableTree.setFilter)
             
   def openTreeContextMenu(self, position):
     menu = QtWidgets.QMenu()
@@ -294,13 +318,23 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     return l[n:] + l[:n] 
 
   
+  def toQDateTime(self, event):
+    '''
+    Get the time stamp of the given event as QDateTime.
+    If the event name could not be converted to a time stamp, it is parsed by Qt as before.
+    '''
+    t = self.worker.timeStamps[event]
+    if numpy.isnan(t):
+      return QtCore.QDateTime.fromString(self.worker.getTimeString(event),"yyyy-MM-dd HH:mm:ss.z")
+    return QtCore.QDateTime.fromMSecsSinceEpoch(int(round(t*1000)))
+
   def setTimeRange(self, event, isFirst):
     '''
     Set the time range indicator and internal time range (event number)
     @param event: The event to be used for the time range
     @param isFirst: If True the first event of the time range is set. Else the last is set.
     '''
-    t = QtCore.QDateTime.fromString(self.worker.getTimeString(event),"yyyy-MM-dd HH:mm:ss.z")
+    t = self.toQDateTime(event)
     if isFirst == True:
       self.timeRange[0] = event
       self.dateFirst.setDateTime(t)
@@ -320,26 +354,12 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
       if tStart >= tEnd:
         self.setStatusBarMsg("Fix the selected range!",'error')
         return
-      last = 0
-      lastQt = None
-      found = None
-      for event in range(self.nEvents):
-        tqt = QtCore.QDateTime.fromString(self.worker.getTimeString(event),"yyyy-MM-dd HH:mm:ss.z")
-        if event == 0:
-          lastQt = tqt
-        elif lastQt >= tqt:
-          self.setStatusBarMsg("Files are not sortet by time stamps. Consider using --sortByTimeStamp option!", 'error')
-          return
-        if found == None and tqt >= tStart:
-          self.timeRange[0] = last
-          self.dateFirst.setDateTime(lastQt)
-          found = True
-        last = event
-        lastQt = tqt
-        if tqt >= tEnd:
-          self.timeRange[1] = event
-          self.dateLast.setDateTime(tqt)
-          break 
+      if not self.worker.isSorted:
+        self.setStatusBarMsg("Files are not sortet by time stamps. Consider using --sortByTimeStamp option!", 'error')
+        return
+      self.timeRange = list(findEventRange(self.worker.timeStamps, tStart.toMSecsSinceEpoch()/1000., tEnd.toMSecsSinceEpoch()/1000.))
+      self.dateFirst.setDateTime(self.toQDateTime(self.timeRange[0]))
+      self.dateLast.setDateTime(self.toQDateTime(self.timeRange[1]))
       self.rangeIsSet = True
    
     self.updateEvent(self.timeRange[0])
@@ -389,10 +409,23 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
         isSingleEvent = True
       else:
         isSingleEvent = False
-      self.worker.prepareDataCollection(eventRange, arrayPosition, isSingleEvent, items,self.spinChainEvents.value(), self.spinDecimation.value())
-      self.worker.start()
+      (nChainEvents, decimation) = (self.spinChainEvents.value(), self.spinDecimation.value())
+      def start():
+        self.worker.prepareDataCollection(eventRange, arrayPosition, isSingleEvent, items, nChainEvents, decimation)
+        self.worker.start()
+      self.scheduler.submit(start)
     
+  def updatePartialData(self):
+    if self.scheduler.isObsolete():
+      return
+    logging.debug("Updating plots with partial data.")
+    for plot in self.plotManagers:
+      plot.appendPlot(self.worker.partialData)
+
   def updateData(self):
+    if self.scheduler.isObsolete():
+      logging.debug("Skipping data of an outdated request.")
+      return
     logging.debug("Updating data in plots.")
     self.bStop.setEnabled(False)
     for plot in self.plotManagers:
@@ -411,7 +444,7 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
   def startTriggerSearchNext(self):
     if not self.worker.isRunning():
       self.bStop.setEnabled(True)
-      self.worker.prepareTrigger(self, self.spinEvent.value(), True, self.triggerOperator.currentText(),self.triggerValue.value(),self.getTriggerArrayPos())
+      self.worker.prepareTrigger(self, self.spinEvent.value(), True, self.triggerOperator.currentText(),self.triggerValue.value(),self.getTriggerArrayPos(),self.simpleSearch.isChecked())
       self.worker.start()
     else:
       self.setStatusBarMsg("Wroker is busy.", 'error')
@@ -419,7 +452,7 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
   def startTriggerSearchPrevious(self):
     if not self.worker.isRunning():
       self.bStop.setEnabled(True)
-      self.worker.prepareTrigger(self, self.spinEvent.value(), False, self.triggerOperator.currentText(),self.triggerValue.value(),self.getTriggerArrayPos())
+      self.worker.prepareTrigger(self, self.spinEvent.value(), False, self.triggerOperator.currentText(),self.triggerValue.value(),self.getTriggerArrayPos(),self.simpleSearch.isChecked())
       self.worker.start()
     else:
       self.setStatusBarMsg("Wroker is busy.", 'error')
@@ -476,6 +509,18 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
   def on_actionSet_Data_Path_triggered(self, triggered):
     QtWidgets.qApp.exit( Ui_MainWindow.EXIT_CODE_REBOOT )
     
+  @staticmethod
+  def getFileOptions(args):
+    '''
+    @return Additional arguments for h5py.File given by the command line arguments.
+    '''
+    options = {}
+    if args.chunkCacheSize != None:
+      options["rdcc_nbytes"] = int(args.chunkCacheSize*1024*1024)
+    if args.chunkCacheSlots != None:
+      options["rdcc_nslots"] = args.chunkCacheSlots
+    return options
+
   def __init__(self, args, parent=None):
     super(HDF5Viewer, self).__init__(parent)
     self.setupUi(self)
@@ -517,7 +562,7 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
         print("The currentBuffer file is missing in the given path. Try using no sort or sortByTimeStamp")
         sys.exit()
       tmpList = HDF5Viewer.rotate(tmpList, currentBuffer)
-      if args.maxFiles != None and args.maxFiles <= len(tmpList):
+      if args.maxFiles != None and 0 < args.maxFiles <= len(tmpList):
         startIndex = len(tmpList) - args.maxFiles
       
     for f in tmpList[startIndex:]:
@@ -528,7 +573,10 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
       logging.error("No files found in current directory.")
       sys.exit(1)
 
-    self.worker = worker(self, files = self.listOfFiles, sortByTimeStamp = args.sortByTimeStamp, maxFiles = args.maxFiles)
+    self.worker = worker(self, files = self.listOfFiles, sortByTimeStamp = args.sortByTimeStamp, maxFiles = args.maxFiles, nProcesses = args.nProcesses, useSummary = args.summary, maxOpenFiles = args.maxOpenFiles,
+                         fileOptions = HDF5Viewer.getFileOptions(args), columnStore = args.columnStore)
+    QtWidgets.QApplication.instance().aboutToQuit.connect(self.worker.shutdown)
+    self.scheduler = RequestScheduler(self.worker, self.stopWorker)
     self.nPlots = args.nPlots
     if self.nPlots <= 2 or self.nPlots == 4:
       nMax = 2
@@ -544,10 +592,8 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     self.treeWidget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
     self.treeWidget.customContextMenuRequested.connect(self.openTreeContextMenu)
 
-    # loop over first data entry to find the variable tree
-    for toplevel in self.worker.files[0]:
-      self.buildVariableTree(self.worker.files[0][toplevel], self.treeWidget, "")
-      break
+    # fill the variable tree
+    self.buildVariableTree()
 
     # count total number of events and build event list
     self.nEvents = self.worker.getNumberOfEvents()
@@ -583,8 +629,8 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     self.dateFirst.setCalendarPopup(True)
     self.dateLast.setCalendarPopup(True)
     
-    t1 = QtCore.QDateTime.fromString(self.worker.getTimeString(0),"yyyy-MM-dd HH:mm:ss.z")
-    t2 = QtCore.QDateTime.fromString(self.worker.getTimeString(-1),"yyyy-MM-dd HH:mm:ss.z")
+    t1 = self.toQDateTime(0)
+    t2 = self.toQDateTime(-1)
     self.dateFirst.setMinimumDateTime(t1)
     self.dateFirst.setMaximumDateTime(t2)
     self.dateLast.setMinimumDateTime(t1)
@@ -605,9 +651,7 @@ class HDF5Viewer(QtWidgets.QMainWindow, Ui_MainWindow):
     self.bStop.clicked.connect(self.stopWorker)
     self.worker.percentage.connect(self.progressBar.setValue)
     self.worker.updated.connect(self.updateData)
-    
-    # Not used with HDF5
-    self.simpleSearch.setEnabled(False)
+    self.worker.updatedPartially.connect(self.updatePartialData)
    
     # call sliderMoved once to update everything
     self.updateEvent(0)
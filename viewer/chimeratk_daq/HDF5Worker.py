@@ -2,10 +2,17 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
 from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5 import QtWidgets
-import h5py
 import logging
 import numpy as np
-import datetime
+import os
+import time
+import threading
+from chimeratk_daq.EventIndex import EventIndex, isSorted
+from chimeratk_daq.HDF5Extractor import Extractor, evaluateBlock
+from chimeratk_daq.Cache import LRUCache
+from chimeratk_daq.FilePool import FilePool
+from chimeratk_daq.ColumnStore import ColumnStore
+from chimeratk_daq.SummaryStore import SummaryStore, SummaryBuilder
 
 class errorPopup(QtWidgets.QWidget):
   '''
@@ -32,6 +39,9 @@ class Trigger():
   - Trigger level: Choose the trigger level
   
   If no event fullfills the trigger search will return the initial start event. 
+  Unless a simple search is requested all events are tested once and the result is stored in a
+  cache per trigger definition (source, operator, threshold, array position). Further searches
+  with the same definition only look up the next triggered event in the cached result.
   @param worker(chimeratk_daq.worker): The worker that is using the trigger.
   @param limits(int,int): The limits of the trigger search.
   '''
@@ -48,56 +58,36 @@ class Trigger():
     self.operator = None
     self.arrayPos = None
     self.isTrace = None
+    self.simpleSearch = False
+    self.results = LRUCache(maxSize = 16) # trigger definition -> (bitmap, triggered events)
 
-  def getValueToCompare(self, hdf5Object):
-    if not self.isTrace:
-      return hdf5Object[0]
-    if(self.arrayPos == -1):
-      arr = np.asarray(hdf5Object)
-      return arr.mean()
-    elif(self.arrayPos == -2):
-      arr = np.asarray(hdf5Object)
-      return arr.max()
-    elif(self.arrayPos == -3):
-      arr = np.asarray(hdf5Object)
-      return arr.min()
-    else:
-      return hdf5Object[self.arrayPos]
-  
-  def testValue(self, hdf5Object):
-    '''
-    Test if a data point fullfills the trigger requirement.
-    This is called on every event to be checked.
-    @return True if event fullfills the trigger requirement.
-    '''
-    for subitem in self.source.split("/"):
-      if subitem != "":
-        hdf5Object = hdf5Object[subitem]
-    if self.operator == ">":
-      if(self.arrayPos == -4):
-        if any(i > self.threshold for i in hdf5Object) == True:
-          return True
-      else:
-        if self.getValueToCompare(hdf5Object) > self.threshold:
-          return True
-    elif self.operator == "<":
-      if(self.arrayPos == -4):
-        if any(i < self.threshold for i in hdf5Object) == True:
-          return True
-      else:
-        if self.getValueToCompare(hdf5Object) < self.threshold:
-          return True
-    elif self.operator == "=":
-      if(self.arrayPos == -4):
-        if any(i == self.threshold for i in hdf5Object) == True:
-          return True
-      else:
-        if self.getValueToCompare(hdf5Object) == self.threshold:
-          return True
-        
+  def testBlock(self, block):
+    '''
+    Test if the events of a block fullfill the trigger requirement.
+    @param block(numpy.ndarray): The trigger source read for a block of events (one row per event).
+    @return Boolean array that is True for events fullfilling the trigger requirement.
+    '''
+    return evaluateBlock(block, self.operator, self.threshold, self.arrayPos)
+
+  def getTriggeredEvents(self):
+    '''
+    Get the sorted event numbers of all events fullfilling the trigger requirement.
+    The result is taken from the cache if the trigger definition was already used.
+    @return Array of event numbers or None if the search was stopped.
+    '''
+    key = (self.source, self.operator, self.threshold, self.arrayPos)
+    result = self.results.get(key)
+    if result is None:
+      logging.debug("Testing all events for trigger: {}".format(key))
+      bitmap = self.worker.extractor.evaluate(np.arange(self.limits[0], self.limits[1]), self.source, self.testBlock, self.arrayPos)
+      if bitmap is None:
+        return None
+      result = (bitmap, np.flatnonzero(bitmap) + self.limits[0])
+      self.results.put(key, result)
+      logging.debug("Found {} triggered events.".format(len(result[1])))
     else:
-      raise TypeError("Unknown operator set: " + self.operator)
-    return False
+      logging.debug("Using cached trigger result.")
+    return result[1]
      
   def popError(self, msg):   
     '''
@@ -108,10 +98,44 @@ class Trigger():
     self.exPopup.setGeometry(100, 200, 700, 100)
     self.exPopup.show()
   
+  def findEventSimple(self, iFirstEvent):
+    '''
+    Search only for the next event fullfilling the trigger requirement. Events are tested block-wise
+    starting next to the given event and the search is stopped at the first block including a triggered event.
+    '''
+    # increasing event number loop
+    if(self.findNext == True):
+      events = np.arange(iFirstEvent + 1, self.limits[1])
+    # decreasing event number loop
+    else:
+      events = np.arange(iFirstEvent - 1, self.limits[0] - 1, -1)
+    position = self.worker.extractor.find(events, self.source, self.testBlock, self.arrayPos)
+    if position >= 0:
+      self.eventNumber = int(events[position])
+      self.found = True
+
+  def findEventCached(self, iFirstEvent):
+    '''
+    Look up the next event fullfilling the trigger requirement in the result of a search over all events.
+    '''
+    triggered = self.getTriggeredEvents()
+    if triggered is None:
+      return
+    if self.findNext == True:
+      index = np.searchsorted(triggered, iFirstEvent, side='right')
+      if index < len(triggered):
+        self.eventNumber = int(triggered[index])
+        self.found = True
+    else:
+      index = np.searchsorted(triggered, iFirstEvent, side='left') - 1
+      if index >= 0:
+        self.eventNumber = int(triggered[index])
+        self.found = True
+
   def findEvent(self):
     '''
-    Actual event/data loop to search for trigger. Trigger search starts 
-    Once a trigger is found search is stopped.
+    Actual event/data loop to search for trigger. The trigger source is read block-wise
+    and the trigger condition is evaluated for a whole block at once.
     You can investigate the trigger search result by checking: 
     - found: True if triggered event is found
     - eventNumber: The event that fullfills the trigger requirement. If no event fullfills the requirement this is the event where the search started.
@@ -124,46 +148,24 @@ class Trigger():
       self.popError(msg)
       return
     iFirstEvent = self.startEvent
+    self.eventNumber = iFirstEvent
     if (iFirstEvent == self.limits[1]) and self.findNext == True:
       logging.debug("Already at the end.")
       return
     if (iFirstEvent == 0) and self.findNext == False:
       logging.debug("Already at the beginning.")
       return
+    self.worker.extractor.progress = lambda fraction: self.worker.percentage.emit(int(100.*fraction))
     try:
-      # increasing event number loop
-      if(self.findNext == True):
-        self.eventNumber = iFirstEvent + 1
-        while(self.eventNumber < self.limits[1]):
-          if self.worker.stop:
-            logging.info("Event loop was stopped by the user.")
-            self.worker.percentage.emit(100)
-            return
-          self.worker.percentage.emit(100.*self.eventNumber/(self.limits[1]-iFirstEvent))
-          if self.testValue(self.worker.getHDF5Object(self.eventNumber)) == True:
-            self.worker.percentage.emit(100)
-            self.found = True
-            return
-          self.eventNumber = self.eventNumber + 1
-        self.eventNumber = iFirstEvent
-      # decreasing event number loop
-      else: 
-        self.eventNumber = iFirstEvent - 1
-        while(self.eventNumber >= self.limits[0]):
-          if self.worker.stop:
-            logging.info("Event loop was stopped by the user.")
-            self.worker.percentage.emit(100)
-            return
-          self.worker.percentage.emit(100.*(iFirstEvent-self.eventNumber)/(iFirstEvent - self.limits[0]))
-          if self.testValue(self.worker.getHDF5Object(self.eventNumber)) == True:
-            self.worker.percentage.emit(100)
-            self.found = True
-            return
-          self.eventNumber = self.eventNumber - 1
-        self.eventNumber = iFirstEvent
+      if self.simpleSearch:
+        self.findEventSimple(iFirstEvent)
+      else:
+        self.findEventCached(iFirstEvent)
     except TypeError as msg:
-      self.eventNumber = iFirstEvent
       self.popError(msg)
+    finally:
+      self.worker.extractor.progress = None
+    self.worker.percentage.emit(100)
 
 class worker(QThread):
   '''
@@ -180,48 +182,143 @@ class worker(QThread):
   triggerResult = pyqtSignal(int)
   percentage = pyqtSignal(int)
   updated = pyqtSignal()
+  updatedPartially = pyqtSignal()
   
-  def __init__(self, app, files, sortByTimeStamp = False, maxFiles = None):
+  def __init__(self, app, files, sortByTimeStamp = False, maxFiles = None, nProcesses = 1, useSummary = False, maxOpenFiles = 64, fileOptions = None, columnStore = None):
     QThread.__init__(self, app)
     self.app = app
     self.stop = False
-    self.files = []      # list of the actual opened hdf5 files
+    self.filenames = []  # list of the hdf5 files considered, see getFile
+    self.fileOptions = fileOptions or {} # additional arguments for h5py.File, e.g. chunk cache settings
+    self.filePool = FilePool(maxOpenFiles, self.fileOptions) # opened hdf5 files
     self.eventList = {}  # pair of file index and hdf5 file toplevel object
+    self.fileIndices = np.empty(0, dtype=np.int64) # file index of each event
+    self.indices = {}    # event index per DAQ directory
+    self.timeStamps = np.empty(0) # time stamp of each event in seconds since EPOCH
+    self.isSorted = True # True if events are sorted by time stamps
     self.nEvents = 0
     self.loadFiles(files, sortByTimeStamp, maxFiles)
     self.trigger = Trigger(self, (0,self.nEvents))
+    self.columns = None  # ColumnStore used instead of the hdf5 files if it covers all files
+    self.columnPositions = None # position of each event in the column store
+    if columnStore != None:
+      self.openColumnStore(columnStore)
     # Data collection parameters
     self.arrayPos = None # array position considered for data colletcion
     self.isSingleEvent = None     # type of data collection
     self.data = {}       # collected data
+    self.partialData = {} # leading part of the data while collecting (see emitPartialData)
+    self.partialInterval = 1. # minimum time between two updatedPartially signals in seconds
+    self.lastPartial = 0.
     self.plotItems = []  # list of items to be collected
     self.nChainEvents = None # NUmber of chained events
     self.eventRange = (0,self.nEvents) # Range to loop over
     self.decimation = None
+    self.extractor = Extractor(self, nProcesses = nProcesses)
+    # Precomputed summaries used for time lines with many events (see collectSummary)
+    self.summary = SummaryStore() if useSummary else None
+    self.summaryBuilder = SummaryBuilder(self, self.summary) if useSummary else None
+    self.summaryPoints = 5000 # time lines with more events are taken from the summary if available
+    self.summarized = {} # item -> statistics of items shown from the summary in the last request (see collectSummary)
+    # held while a request is processed, so the summary builder and the prefetch do not read at the same time
+    self.requestLock = threading.Lock()
+    # Traces of single events, used when moving through the events (see getTrace)
+    self.traceCache = LRUCache(maxSize = 10000, maxBytes = 256*1024*1024) # (event, item) -> (x, y)
+    self.nPrefetch = 4   # number of events read in advance in the direction the event number is changing
+    self.lastEvent = None
+    self.prefetchRequest = 0 # incremented to stop a running prefetch
         
   def loadFiles(self, files, sortByTimeStamp, maxFiles):
-    for filename in files:
-      try:
-        self.files.append(h5py.File(filename, 'r'))
-        # no need to check max files here because is sortByTimeStamp is false the shrinking is already done
-      except OSError:
-        logging.error("Failed to open file: " + filename)
+    '''
+    Read the events of the given files. Files are only opened if they are not in the event index yet.
+    @param sortByTimeStamp(bool): Sort the files by the name of their first event. Only the first event name
+                                  is read (or taken from the event index) before the files are selected.
+    @param maxFiles(int): If sortByTimeStamp is set only the last maxFiles files are opened. None or 0 means no limit.
+    '''
     if sortByTimeStamp:
-      # if sort by time stamp is required sort and shrink list now
+      # if sort by time stamp is required sort and shrink list before opening the files
+      # if sortByTimeStamp is false the shrinking is already done
       logging.debug("Sorting files by time stamp...")
-      self.files.sort(key=lambda x: next(iter(x.keys())))
-      self.files = self.files[len(self.files)-maxFiles:]
+      files = sorted(files, key=lambda filename: self.getIndex(filename).getFirstEvent(filename))
+      if maxFiles != None and 0 < maxFiles < len(files):
+        files = files[len(files)-maxFiles:]
+      for index in self.indices.values():
+        index.save()
       logging.debug("Sorting files done.")
-      
 
     logging.info("Reading events...")
-    fileIndex = 0
-    for theFile in self.files:
-      logging.info("File " + str(fileIndex) + " (" + theFile.filename + ")")
-      for toplevel in theFile:
+    timeStamps = []
+    for filename in files:
+      try:
+        (events, fileTimeStamps) = self.getIndex(filename).getEvents(filename, self.filePool.use)
+      except OSError:
+        logging.error("Failed to open file: " + filename)
+        continue
+      fileIndex = len(self.filenames)
+      logging.info("File " + str(fileIndex) + " (" + filename + ")")
+      self.filenames.append(filename)
+      for toplevel in events:
         self.eventList[self.nEvents] = (fileIndex, toplevel)
         self.nEvents = self.nEvents + 1
-      fileIndex = fileIndex + 1
+      timeStamps.append(np.asarray(fileTimeStamps, dtype=np.float64))
+    if len(timeStamps) > 0:
+      self.timeStamps = np.concatenate(timeStamps)
+      self.fileIndices = np.repeat(np.arange(len(timeStamps)), [len(t) for t in timeStamps])
+    self.isSorted = isSorted(self.timeStamps)
+    if not self.isSorted:
+      logging.warning("Files are not sorted by time stamps. Selecting a time range will not work.")
+    for index in self.indices.values():
+      index.save()
+
+  def openColumnStore(self, path):
+    '''
+    Use a column store (see ColumnStore.convert) for data collection. It is only used if it
+    includes all files in their current state.
+    @param path(string): The column store directory.
+    '''
+    try:
+      store = ColumnStore(path)
+      positions = store.mapEvents(self.filenames, np.bincount(self.fileIndices, minlength=len(self.filenames)))
+    except (OSError, ValueError, KeyError) as e:
+      logging.warning("Failed to open column store {}: {}".format(path, e))
+      return
+    if positions is None:
+      logging.warning("Column store {} does not match the files. It is not used.".format(path))
+      return
+    logging.info("Using column store {}.".format(path))
+    self.columns = store
+    self.columnPositions = positions
+
+  def getIndex(self, filename):
+    '''
+    Get the event index of the directory the given file is located in.
+    @param filename(string): The HDF5 file name.
+    '''
+    path = os.path.dirname(os.path.abspath(filename))
+    if not path in self.indices:
+      self.indices[path] = EventIndex(path)
+    return self.indices[path]
+
+  def getSchema(self):
+    '''
+    Get the variables of the first event (see EventIndex.getSchema).
+    '''
+    if len(self.filenames) == 0:
+      return {}
+    index = self.getIndex(self.filenames[0])
+    schema = index.getSchema(self.filenames[0], self.filePool.use)
+    index.save()
+    return schema
+
+  def getFile(self, fileIndex):
+    '''
+    Get an opened HDF5 file. Files are opened on demand and only a limited number is kept open (see FilePool).
+    Use it as context manager, e.g. with worker.getFile(0) as theFile: ... The file is not closed while
+    it is used, but it can be closed afterwards, so the file object and objects read from it should not be kept.
+    @param fileIndex(int): Index of the file in filenames.
+    @return Context manager providing the h5py.File object.
+    '''
+    return self.filePool.use(self.filenames[fileIndex])
 
   def getTimeString(self, event):
     ''' 
@@ -234,23 +331,25 @@ class worker(QThread):
     (fileIndex, toplevel) = self.eventList[event]
     return toplevel
   
-  def getHDF5Object(self, event):
+  def getTimeStamp(self, event):
     '''
-    Get the HDF5 object correcponding to the given event number.
-    @param event(int): Event numbner.
+    Get the timestamp of an event.
+    @param event(int): Event number.
+    @return Pair of seconds since EPOCH and milliseconds. None if the event name is no time stamp
+            (see getTimeString).
     '''
-    # find corresponding top-level directory name and file
-    (fileIndex, toplevel) = self.eventList[event]
-    # get the file
-    theFile = self.files[fileIndex]
-    # return the toplevel object
-    return theFile[toplevel]
+    t = self.timeStamps[event]
+    if np.isnan(t):
+      return None
+    seconds = int(np.floor(t))
+    return (seconds, min(int(round((t - seconds)*1000)), 999))
 
   def getNumberOfEvents(self):
     return self.nEvents
   
-  def prepareTrigger(self, app, startEvent, next, operator, threshold, arrayPosition):
+  def prepareTrigger(self, app, startEvent, next, operator, threshold, arrayPosition, simpleSearch = False):
     self.trigger.threshold = threshold
+    self.trigger.simpleSearch = simpleSearch
     self.trigger.operator = operator
     self.trigger.arrayPos = arrayPosition
     self.trigger.searchRequested = True
@@ -269,6 +368,116 @@ class worker(QThread):
     self.decimation = decimation
     self.stop = False
     
+  def emitPartialData(self, x, data, nFilled):
+    '''
+    Publish the leading events collected so far via partialData and emit updatedPartially.
+    The signal is emitted at most every partialInterval seconds.
+    '''
+    if time.monotonic() - self.lastPartial < self.partialInterval:
+      return
+    self.lastPartial = time.monotonic()
+    self.partialData = {item: (x[:nFilled], y[:nFilled]) for (item, y) in data.items()}
+    self.updatedPartially.emit()
+
+  def getTrace(self, event, item):
+    '''
+    Get the trace of a single event. Traces are cached in traceCache.
+    @return Tuple of index array and data array.
+    '''
+    if self.columns != None and item in self.columns:
+      return self.columns.getTrace(self.columnPositions[event], item)
+    key = (event, item)
+    trace = self.traceCache.get(key)
+    if trace is None:
+      trace = self.extractor.collectTrace(event, item)
+      self.traceCache.put(key, trace)
+    return trace
+
+  def prefetch(self, event, step, items, request):
+    '''
+    Read the traces of the events following event in direction step into the traceCache.
+    Runs in a separate thread and stops as soon as another prefetch is requested. Each trace is read
+    holding the request lock, since the extractor is shared with the requests (e.g. bytesRead).
+    '''
+    for i in range(1, self.nPrefetch + 1):
+      nextEvent = event + i*step
+      if nextEvent < 0 or nextEvent >= self.nEvents:
+        break
+      for item in items:
+        with self.requestLock:
+          if request != self.prefetchRequest:
+            return
+          if not (nextEvent, item) in self.traceCache:
+            try:
+              self.traceCache.put((nextEvent, item), self.extractor.collectTrace(nextEvent, item))
+            except (KeyError, OSError, ValueError) as e:
+              logging.debug("Prefetching event {} failed: {}".format(nextEvent, e))
+              return
+
+  def startPrefetch(self, event):
+    '''
+    Start reading the next events in the background. The direction is taken from the last requested event.
+    '''
+    self.prefetchRequest = self.prefetchRequest + 1
+    step = -1 if self.lastEvent != None and event < self.lastEvent else 1
+    self.lastEvent = event
+    if self.nPrefetch > 0:
+      threading.Thread(target=self.prefetch, args=(event, step, list(self.plotItems), self.prefetchRequest), daemon=True).start()
+
+  def collectColumns(self, events):
+    '''
+    Fill the data from the column store if it includes all items.
+    @param events(numpy.ndarray): The events requested.
+    @return True if the data was filled from the column store.
+    '''
+    if self.columns == None or any(not item in self.columns for item in self.plotItems):
+      return False
+    x = self.timeStamps[events]
+    positions = self.columnPositions[events]
+    for item in self.plotItems:
+      self.data[item] = (x, self.columns.collect(positions, item, self.arrayPos))
+    return True
+
+  def collectSummary(self, events):
+    '''
+    Try to fill the data from the SummaryStore. For each time bucket the minimum and the maximum of its events
+    are filled, so peaks are kept. If the summary is not available yet for all files its creation is requested
+    in the background.
+    For each item filled from the summary summarized holds the bucket width (resolution) and mean and standard
+    deviation (mean, std) of all events.
+    @param events(numpy.ndarray): The events requested.
+    @return True if the data was filled from the summary.
+    '''
+    if self.summary == None or not self.isSorted or len(events) <= self.summaryPoints:
+      return False
+    filenames = [self.filenames[i] for i in np.unique(self.fileIndices[events])]
+    (tStart, tEnd) = (self.timeStamps[events[0]], self.timeStamps[events[-1]])
+    data = {}
+    summarized = {}
+    for item in self.plotItems:
+      timeLine = self.summary.getTimeLine(filenames, item, self.arrayPos, tStart, tEnd, self.summaryPoints)
+      if timeLine == None or len(timeLine["x"]) >= len(events):
+        self.summaryBuilder.request(self.plotItems, self.arrayPos)
+        return False
+      count = timeLine["count"]
+      mean = np.sum(timeLine["y"]*count)/np.sum(count)
+      variance = np.sum((timeLine["std"]**2 + timeLine["y"]**2)*count)/np.sum(count) - mean**2
+      summarized[item] = {"resolution": timeLine["resolution"], "mean": mean, "std": np.sqrt(max(variance, 0.))}
+      data[item] = (np.repeat(timeLine["x"], 2), np.column_stack((timeLine["min"], timeLine["max"])).reshape(-1))
+    logging.debug("Using summary for {} events.".format(len(events)))
+    self.data.update(data)
+    self.summarized = summarized
+    return True
+
+  def shutdown(self):
+    '''
+    Stop the current request and shut down the processes used for parallel data collection.
+    This is called when the application quits.
+    '''
+    self.stop = True
+    self.wait()
+    self.extractor.shutdown()
+
   def run(self):
     '''
     The worker can perform two tasks:
@@ -280,15 +489,25 @@ class worker(QThread):
     In case the parameter is an array per event and no chain is used
     only the user defined index is considered,
     @signal: percentage: Updates the percentage that is already processed.
+    @signal: updatedPartially: Emitted while collecting when more events are available in partialData
     @signal: updated: Emitted when worker is ready
     
     @warning: Don't use the signal finished, since it is emitted in both cases and you don't know what was done. 
     '''
-    
+    # the summary builder pauses while a request is processed
+    with self.requestLock:
+      self.process()
+
+  def process(self):
+    '''
+    Perform the requested task (see run).
+    '''
+    self.extractor.resetStatistics()
     # Trigger search
     if self.trigger.searchRequested:
       logging.debug("Satring trigger search.")
       self.trigger.findEvent()
+      logging.debug("Read {:.3f} MB from files.".format(self.extractor.bytesRead/1024/1024))
       
       if not self.trigger.found:
         logging.info("No trigged event found!")
@@ -302,62 +521,28 @@ class worker(QThread):
     # Data collection
     else:
       logging.debug("Starting data collection.")
-  
-      for event in range(self.eventRange[0], self.eventRange[1], self.decimation):
-        if self.stop:
-          logging.info("Event loop was stopped by the user.")
-          break
-        #event loop
-        hdfObject = self.getHDF5Object(event)
+      self.summarized = {}
+      if self.isSingleEvent:
+        if self.eventRange[1] - self.eventRange[0] != 1:
+          logging.error("Error when type no chain is requested.")
         for item in self.plotItems:
-          if not item in self.data:
-            self.data[item] = ([],[])
-          # item loop
-#           logging.debug("Looking for item: /{}{}".format(toplevel,item))
-          toplevel = self.eventList[event][1]
-          dataObject = hdfObject["/"+toplevel+item]
-#           logging.debug("Object has shape: {} test: {}".format(dataObject.shape[0], dataObject.shape[0] > 1))
-          
-          timestamp = datetime.datetime.strptime(toplevel.strip('/'),"%Y-%m-%d %H:%M:%S.%f")
-          if self.isSingleEvent:
-            if self.eventRange[1] - self.eventRange[0] != 1:
-              logging.error("Error when type no chain is requested.")
-            arr = np.asarray(dataObject,dtype=np.float32)
-            i = 0
-            for y in arr:
-              self.data[item][0].append(i)
-              self.data[item][1].append(y)
-              i = i+1 
-          else:
-            self.data[item][0].append(timestamp.timestamp())
-            if not dataObject.shape[0] > 1:
-              # scalar
-#               logging.debug("Extracted scalar data: {}".format(dataObject[0]))
-              self.data[item][1].append(dataObject[0])
-            else:
-              # array
-              arr = np.asarray(dataObject,dtype=np.float32)
-              if self.arrayPos >= 0:
-                self.data[item][1].append(arr[self.arrayPos])
-#                 logging.debug("Extracted array data: {}".format(arr[self.arrayPos]))
-              elif self.arrayPos == -1:
-                arr = np.asarray(dataObject)
-                self.data[item][1].append(arr.mean())
-              elif self.arrayPos == -2:
-                arr = np.asarray(dataObject)
-                self.data[item][1].append(arr.max())
-              elif self.arrayPos == -3:
-                arr = np.asarray(dataObject)
-                self.data[item][1].append(arr.min())
-              else:
-                logging.error("Unknown array position: {}".format(self.arrayPos))
-          
-        self.percentage.emit(int(100.*event/(self.eventRange[1]-self.eventRange[0])))
-      for item in self.plotItems:
-        # convert to numpy
-        self.data[item] = (np.asarray(self.data[item][0]),np.asarray(self.data[item][1]))
+          self.data[item] = self.getTrace(self.eventRange[0], item)
+        self.startPrefetch(self.eventRange[0])
+        logging.debug("Trace cache: " + self.traceCache.getStatistics())
+      else:
+        events = np.arange(self.eventRange[0], self.eventRange[1], self.decimation)
+        if not self.collectColumns(events) and not self.collectSummary(events):
+          x = self.timeStamps[events]
+          self.extractor.progress = lambda fraction: self.percentage.emit(int(100.*fraction))
+          self.extractor.partial = lambda data, nFilled: self.emitPartialData(x, data, nFilled)
+          self.lastPartial = time.monotonic()
+          for (item, y) in self.extractor.collectItems(events, list(self.plotItems), self.arrayPos).items():
+            self.data[item] = (x[:len(y)], y)
+          self.extractor.progress = None
+          self.extractor.partial = None
       self.percentage.emit(100)
       self.updated.emit()
+      logging.debug("Read {:.3f} MB from files.".format(self.extractor.bytesRead/1024/1024))
       logging.debug("Data collection done")
       return 
  
\ No newline at end of file
@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+import numpy as np
+from chimeratk_daq.EventIndex import isSorted
+
+def reduceLevel(y, indices, factor):
+  '''
+  Combine factor neighbouring bins of a level into one bin.
+  @param y(numpy.ndarray): The original data.
+  @param indices(numpy.ndarray): 2D array with the positions of the minimum (column 0) and
+                                 maximum (column 1) in y for each bin of the lower level.
+  @param factor(int): Number of bins to be combined.
+  @return 2D array of the positions of minimum and maximum for each bin of the new level.
+  '''
+  nBins = -(-len(indices)//factor)
+  pad = nBins*factor - len(indices)
+  result = np.empty((nBins, 2), dtype=np.int64)
+  for (column, fill, select) in ((0, np.inf, np.argmin), (1, -np.inf, np.argmax)):
+    values = y[indices[:,column]]
+    # nan is ignored unless all values of a bin are nan
+    values = np.where(np.isnan(values), fill, values)
+    values = np.concatenate((values, np.full(pad, fill))).reshape(nBins, factor)
+    positions = np.concatenate((indices[:,column], np.full(pad, indices[-1,column]))).reshape(nBins, factor)
+    result[:,column] = positions[np.arange(nBins), select(values, axis=1)]
+  return result
+
+class MinMaxPyramid():
+  '''
+  Level of detail representation of a series used for plotting.
+  Level 0 is the original data. Each higher level combines factor bins of the level below and
+  keeps the positions of the minimum and the maximum of each bin. Thus peaks are preserved
+  on every level. Only the points needed for the current view resolution are handed to the plot.
+  @param x(numpy.ndarray): The x values. They have to be sorted.
+  @param y(numpy.ndarray): The y values.
+  @param factor(int): Number of bins combined in the next level.
+  '''
+  def __init__(self, x, y, factor = 4):
+    self.x = np.asarray(x)
+    self.y = np.asarray(y, dtype=np.float64)
+    self.factor = factor
+    self.levels = [np.stack((np.arange(len(self.y)), np.arange(len(self.y))), axis=1)]
+    while len(self.levels[-1]) > factor:
+      self.levels.append(reduceLevel(self.y, self.levels[-1], factor))
+    logging.debug("Created min/max pyramid with {} levels for {} points.".format(len(self.levels), len(self.y)))
+
+  def getLevel(self, first, last, maxPoints):
+    '''
+    @return The lowest level that shows the events first to last with at most maxPoints points.
+    '''
+    level = 0
+    while level < len(self.levels) - 1 and 2*(last - first)/self.factor**level > maxPoints:
+      level = level + 1
+    return level
+
+  def getData(self, xMin, xMax, maxPoints):
+    '''
+    Get the data to be plotted for the given x range.
+    One additional bin is added on each side so lines continue to the edges of the view.
+    @param xMin(float): Start of the visible range.
+    @param xMax(float): End of the visible range.
+    @param maxPoints(int): Maximum number of points to be returned, e.g. twice the width of the plot in pixels.
+    @return Tuple of the level, x and y arrays.
+    '''
+    first = max(int(np.searchsorted(self.x, xMin, side='left')) - 1, 0)
+    last = min(int(np.searchsorted(self.x, xMax, side='right')) + 1, len(self.x))
+    level = self.getLevel(first, last, maxPoints)
+    binSize = self.factor**level
+    indices = self.levels[level][first//binSize:-(-last//binSize)]
+    # put minimum and maximum of each bin in the order they occur
+    indices = np.sort(indices, axis=1).ravel()
+    if level == 0:
+      indices = indices[::2]
+    return (level, self.x[indices], self.y[indices])
+
+class CurveLOD():
+  '''
+  Level of detail handling for the curves of a pyqtgraph PlotWidget.
+  For every curve a MinMaxPyramid is kept. When the x range of the plot changes the curves get the
+  data of the level matching the current view resolution, without reading the files again.
+  Short series and series with unsorted x values are passed to the curve as they are.
+  @param plot(pyqtgraph.PlotWidget): The plot.
+  @param minPoints(int): Series with less points are not downsampled.
+  '''
+  def __init__(self, plot, minPoints = 10000):
+    self.plot = plot
+    self.minPoints = minPoints
+    self.pyramids = {}      # curve -> MinMaxPyramid
+    self.shown = {}         # curve -> (level, number of points) currently shown
+    self.plot.getPlotItem().getViewBox().sigXRangeChanged.connect(self.update)
+
+  def setData(self, curve, x, y):
+    '''
+    Set the data of a curve.
+    '''
+    self.shown.pop(curve, None)
+    if len(x) < self.minPoints or not isSorted(x):
+      self.pyramids.pop(curve, None)
+      curve.setData(x, y)
+      return
+    self.pyramids[curve] = MinMaxPyramid(x, y)
+    self.updateCurve(curve)
+
+  def clear(self):
+    self.pyramids.clear()
+    self.shown.clear()
+
+  def update(self):
+    for curve in self.pyramids:
+      self.updateCurve(curve)
+
+  def updateCurve(self, curve):
+    viewBox = self.plot.getPlotItem().getViewBox()
+    if viewBox.autoRangeEnabled()[0]:
+      # show the whole series, else auto range would shrink to the data shown
+      (xMin, xMax) = (-np.inf, np.inf)
+    else:
+      (xMin, xMax) = viewBox.viewRange()[0]
+    (level, x, y) = self.pyramids[curve].getData(xMin, xMax, 2*max(int(viewBox.width()), 100))
+    if self.shown.get(curve) == (level, len(x), x[0] if len(x) else None):
+      return
+    self.shown[curve] = (level, len(x), x[0] if len(x) else None)
+    curve.setData(x, y)
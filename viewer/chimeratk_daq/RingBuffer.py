@@ -0,0 +1,57 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import numpy as np
+
+class RingBuffer():
+  '''
+  History of the latest samples of a scalar with fixed memory usage.
+  Time stamps and values are stored in preallocated arrays. Every sample is written twice
+  (at i and i + depth), so the samples in time order are always available as a contiguous view
+  without copying (see getData).
+  @param depth(int): Maximum number of samples kept. Older samples are overwritten.
+  '''
+  def __init__(self, depth):
+    self.depth = max(int(depth), 1)
+    self.t = np.full(2*self.depth, np.nan)
+    self.y = np.full(2*self.depth, np.nan)
+    self.position = 0       # index of the next sample
+    self.count = 0          # number of samples stored
+
+  def append(self, t, y):
+    '''
+    Add a sample.
+    @param t(float): Time stamp in seconds since EPOCH.
+    @param y(float): The value.
+    '''
+    self.extend(np.array([t]), np.array([y]))
+
+  def extend(self, t, y):
+    '''
+    Add several samples at once. If more than depth samples are given only the last depth samples are kept.
+    @param t(numpy.ndarray): Time stamps in seconds since EPOCH, oldest first.
+    @param y(numpy.ndarray): The values.
+    '''
+    t = np.asarray(t, dtype=np.float64)[-self.depth:]
+    y = np.asarray(y, dtype=np.float64)[-self.depth:]
+    indices = (self.position + np.arange(len(t))) % self.depth
+    self.t[indices] = t
+    self.t[indices + self.depth] = t
+    self.y[indices] = y
+    self.y[indices + self.depth] = y
+    self.position = (self.position + len(t)) % self.depth
+    self.count = min(self.count + len(t), self.depth)
+
+  def getData(self):
+    '''
+    @return Tuple of time stamp and value arrays in time order. The arrays are views of the buffer
+            and change with the next extend.
+    '''
+    start = (self.position - self.count) % self.depth
+    return (self.t[start:start + self.count], self.y[start:start + self.count])
+
+  def clear(self):
+    self.position = 0
+    self.count = 0
+
+  def __len__(self):
+    return self.count
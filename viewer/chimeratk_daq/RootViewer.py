@@ -19,6 +19,9 @@ from PyQt5 import QtWidgets
 import pyqtgraph as pg
 
 from chimeratk_daq.TimeXAxis import DateAxisItem, getDateString
+from chimeratk_daq.EventIndex import findEventRange
+from chimeratk_daq.LevelOfDetail import CurveLOD
+from chimeratk_daq.Scheduler import RequestScheduler
 
 ## Switch to using white background and black foreground
 pg.setConfigOption('background', 'w')
@@ -70,12 +73,14 @@ class TableManager():
       item.setText(parameter[0])
       self.app.tableWidget.setItem(parameter[1],0, item)
       item = QtWidgets.QTableWidgetItem()
-      if treeData[parameter[0]].x.size() > 1:
-        arr = numpy.asanyarray(list(treeData[parameter[0]].y), dtype = numpy.float32)
+      if not parameter[0] in treeData:
+        logging.error("No data available for " + parameter[0])
+      elif len(treeData[parameter[0]].x) > 1:
+        arr = treeData[parameter[0]].y
         item.setForeground(QtGui.QBrush(QtGui.QColor("#48ba0b")))
         item.setText("µ="+"%.3f" % arr.mean() + " σ=" + "%.3f" % arr.std())
       else:
-        item.setText(str(treeData[parameter[0]].y.at(0)))
+        item.setText(str(treeData[parameter[0]].y[0]))
       self.app.tableWidget.setItem(parameter[1],1, item)
       
   def removeRows(self, rows):
@@ -93,11 +98,14 @@ class PlotManager():
     self.app = app
     self.legend = None
     self.plotItems = []    
+    self.data = None      # data shown in the plot (see updatePlot)
+    self.curves = {}      # plot item -> curve shown in the plot
     self.plot = pg.PlotWidget()
     self.plot.setAcceptDrops(True)
     self.plot.dropEvent = self.dropEvent
     self.plot.dragEnterEvent = dragEnterEventGraph
     self.plot.dragMoveEvent = dragMoveEventGraph
+    self.lod = CurveLOD(self.plot)
     self.axis = DateAxisItem(plotItem=self.plot.getPlotItem(), orientation='bottom')
     self.axis.hide()
     
@@ -131,10 +139,29 @@ class PlotManager():
     ev.accept()
     self.putGraph()
       
+  def appendPlot(self, treeData):
+    '''
+    Show the data collected so far while the worker is still running.
+    The data of existing curves is replaced by the longer data. Curves are only created
+    if the plot does not show all items yet.
+    '''
+    if len(self.plotItems) == 0 or any(not item in treeData for item in self.plotItems):
+      return
+    if any(not item in self.curves for item in self.plotItems):
+      self.updatePlot(treeData)
+      return
+    self.data = treeData
+    for item in self.plotItems:
+      self.lod.setData(self.curves[item], treeData[item].x, treeData[item].y)
+
   def updatePlot(self, treeData):
     # reset the plot and remove legend and title
     self.plot.clear()
+    self.lod.clear()
     self.plot.setTitle("")
+    self.curves = {}
+    # the curves use views of the worker data -> keep it alive while it is plotted
+    self.data = treeData
     # add legend if multiple plot entries are present - will stay also if later only one plot is added
     if self.legend == None and len(self.plotItems) > 1:
       self.legend = self.plot.addLegend()
@@ -144,28 +171,32 @@ class PlotManager():
     # loop over plot entries
     for item in self.plotItems :
       self.app.setStatusBarMsg("Updating" + item + " data..." )
-      if treeData[item].x.size() != treeData[item].y.size():
-        logging.error("Array length not matching-> x: " + str(treeData[item].x.size()) + " y: " + str(treeData[item].y.size()))
+      if not item in treeData:
+        logging.error("No data available for " + item)
+        continue
+      if len(treeData[item].x) != len(treeData[item].y):
+        logging.error("Array length not matching-> x: " + str(len(treeData[item].x)) + " y: " + str(len(treeData[item].y)))
         continue
       myPen = pg.mkPen(penIndex,len(self.plotItems))
       penIndex = penIndex + 1
       if len(self.plotItems) == 1:
         self.plot.setTitle(item)
-      if treeData[item].x.size() > 1:
+      if len(treeData[item].x) > 1:
         isTrace = True
       else:
         isScalar = True
-      if (self.app.chainCombo.currentIndex() == 0 and treeData[item].x.size() > 1):
+      if (self.app.chainCombo.currentIndex() == 0 and len(treeData[item].x) > 1):
         # don't use time axis if plotting a trace
         self.setup(False)
       else:
         self.setup(True)
       curve = None
-      if (treeData[item].x.size() == 1):
+      if (len(treeData[item].x) == 1):
         curve = self.plot.plot(pen=myPen, name=item, symbol='o')
       else :
         curve = self.plot.plot(pen=myPen, name=item)
-      curve.setData(list(treeData[item].x), list(treeData[item].y))
+      self.lod.setData(curve, treeData[item].x, treeData[item].y)
+      self.curves[item] = curve
       axis = self.plot.getPlotItem().axes['bottom']['item']
       
       if (self.app.worker.isLLRFData and self.app.chainCombo.currentIndex() == 0):
@@ -287,37 +318,52 @@ class RootViewer(QtWidgets.QMainWindow, Ui_MainWindow):
     The number of events and event selection is done in dependence of the current
     user option.
     The data collection is done by the worker thread. The GUI will be updated by updateData
-    if the worker finished.
+    if the worker finished. If the worker is busy the request is scheduled (see RequestScheduler).
     '''
-    if self.worker.isRunning():
-      logging.info("Skipped update since another update is running...")
-      return
     if(pvSet.size() != 0):
-      self.bStop.setEnabled(True)
-      arrayPosition = self.spinArrayPosition.value()
-      if(self.spinArrayPosition.isEnabled() == False):
-        arrayPosition = -1*self.eventArrayCombo.currentIndex() -1
-        logging.debug("Using array property: " + str(arrayPosition))
-      else:
-        logging.debug("Using array position: " + str(arrayPosition))
-      if self.chainCombo.currentIndex() == 0 and pvSet.size() != 0:
-        self.worker.prepareWorker(nEvents=1, pvs=pvSet, type=0, currentEvent=self.horizontalSlider.value())
-      elif self.chainCombo.currentIndex() == 1 and pvSet.size() != 0:
-        self.worker.prepareWorker(nEvents=self.spinChainEvents.value(), pvs=pvSet, currentEvent=self.horizontalSlider.value(), 
-                                  type=1, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
-      elif self.chainCombo.currentIndex() == 2 and pvSet.size() != 0:
-        self.worker.prepareWorker(nEvents=(self.timeRange[1]-self.timeRange[0]), pvs=pvSet, currentEvent=self.horizontalSlider.value(), 
-                                  type=2, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
-      else:
-        self.worker.prepareWorker(nEvents=self.nEvents, pvs=pvSet, currentEvent=0, 
-                                  type=3, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
-      self.progressBar.setValue(0)
-      self.worker.start()
+      self.scheduler.submit(lambda: self.startWorker(pvSet))
+
+  def startWorker(self, pvSet):
+    '''
+    Prepare and start the worker for the current user options. Called by the scheduler once the worker is idle.
+    '''
+    self.bStop.setEnabled(True)
+    arrayPosition = self.spinArrayPosition.value()
+    if(self.spinArrayPosition.isEnabled() == False):
+      arrayPosition = -1*self.eventArrayCombo.currentIndex() -1
+      logging.debug("Using array property: " + str(arrayPosition))
+    else:
+      logging.debug("Using array position: " + str(arrayPosition))
+    if self.chainCombo.currentIndex() == 0 and pvSet.size() != 0:
+      self.worker.prepareWorker(nEvents=1, pvs=pvSet, type=0, currentEvent=self.horizontalSlider.value())
+    elif self.chainCombo.currentIndex() == 1 and pvSet.size() != 0:
+      self.worker.prepareWorker(nEvents=self.spinChainEvents.value(), pvs=pvSet, currentEvent=self.horizontalSlider.value(), 
+                                type=1, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
+    elif self.chainCombo.currentIndex() == 2 and pvSet.size() != 0:
+      self.worker.prepareWorker(nEvents=(self.timeRange[1]-self.timeRange[0]), pvs=pvSet, currentEvent=self.horizontalSlider.value(), 
+                                type=2, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
+    else:
+      self.worker.prepareWorker(nEvents=self.nEvents, pvs=pvSet, currentEvent=0, 
+                                type=3, arrayPosition=arrayPosition, decimation=self.spinDecimation.value())
+    self.progressBar.setValue(0)
+    self.worker.start()
     
+  def updatePartialData(self):
+    '''
+    This is called while the worker is collecting time lines and more events are available.
+    '''
+    if self.scheduler.isObsolete():
+      return
+    for i in range(0, self.nPlots):
+      self.plotManagers[i].appendPlot(self.worker.partialData)
+
   def updateData(self):
     '''
     This is called when the worker is finished and new data is available.
     '''
+    if self.scheduler.isObsolete():
+      logging.debug("Skipping data of an outdated request.")
+      return
     self.setStatusBarMsg("Updating plots ...",'info')
     # update all plots
     for i in range(0, self.nPlots):
@@ -516,24 +562,12 @@ class RootViewer(QtWidgets.QMainWindow, Ui_MainWindow):
       if tStart >= tEnd:
         self.setStatusBarMsg("Fix the selected range!", 'error')
         return
-      last = 0
-      lastQt = None
-      found = None
-      for event in range(self.nEvents):
-        ts,tms = self.worker.getTimeStamp(event)
-        tqt = QtCore.QDateTime.fromMSecsSinceEpoch(int(ts*1000+tms))
-        if event == 0:
-          lastQt = tqt
-        if found == None and tqt >= tStart:
-          self.timeRange[0] = last
-          self.dateFirst.setDateTime(lastQt)
-          found = True
-        last = event
-        lastQt = tqt
-        if tqt >= tEnd:
-          self.timeRange[1] = event
-          self.dateLast.setDateTime(tqt)
-          break 
+      if not self.worker.isSorted:
+        self.setStatusBarMsg("Files are not sortet by time stamps. Consider using --sortByTimeStamp option!", 'error')
+        return
+      self.timeRange = list(findEventRange(self.worker.timeStamps, tStart.toMSecsSinceEpoch()/1000., tEnd.toMSecsSinceEpoch()/1000.))
+      self.dateFirst.setDateTime(QtCore.QDateTime.fromMSecsSinceEpoch(int(round(self.worker.timeStamps[self.timeRange[0]]*1000))))
+      self.dateLast.setDateTime(QtCore.QDateTime.fromMSecsSinceEpoch(int(round(self.worker.timeStamps[self.timeRange[1]]*1000))))
       self.rangeIsSet = True
     self.updateEvent(self.timeRange[0])
     
@@ -673,6 +707,7 @@ class RootViewer(QtWidgets.QMainWindow, Ui_MainWindow):
     self.bPlot.clicked.connect(self.dateToPlotRange)
     self.bStop.clicked.connect(self.worker.stop)
     self.worker.updated.connect(self.updateData)
+    self.worker.updatedPartially.connect(self.updatePartialData)
     self.worker.triggerResult.connect(self.trigger.handleTrigger)
     self.progressBar.setRange(0,100)
     self.worker.percentage.connect(self.progressBar.setValue)
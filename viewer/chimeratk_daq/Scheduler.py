@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import time
+import logging
+from collections import deque
+from PyQt5.QtCore import QObject
+
+class RequestScheduler(QObject):
+  '''
+  Schedules data requests to a worker thread.
+  Only one request is processed by the worker at a time. A request submitted while the worker
+  is busy replaces any request still waiting (only the latest one is kept) and the running
+  request is stopped if it was submitted with cancel set. When the worker is finished the waiting
+  request is started. Thus the last requested event or range is always shown, while
+  intermediate requests, e.g. from moving the slider quickly, are dropped.
+  The latency between submitting the latest request and the worker being finished with it
+  (including the handling of the updated signal in the GUI) is measured.
+  @param worker(QThread): The worker thread.
+  @param stop: Callable used to stop the running request.
+  '''
+  def __init__(self, worker, stop):
+    super().__init__()
+    self.worker = worker
+    self.stop = stop
+    self.pending = None      # tuple (start, cancel, submit time) of the request waiting
+    self.running = None      # tuple (cancel, submit time) of the request processed by the worker
+    self.latencies = deque(maxlen = 100) # latencies of the latest requests in seconds
+    self.worker.finished.connect(self.finished)
+
+  def submit(self, start, cancel = True):
+    '''
+    Submit a request.
+    @param start: Callable preparing and starting the worker. It is called once the worker is idle.
+    @param cancel(bool): If True the request may be stopped when a newer request is submitted.
+    '''
+    if not self.worker.isRunning():
+      self.pending = None
+      self.startRequest(start, cancel, time.monotonic())
+      return
+    if self.pending != None:
+      logging.debug("Dropping request that was not started yet.")
+    self.pending = (start, cancel, time.monotonic())
+    if self.running != None and self.running[0]:
+      logging.debug("Stopping running request.")
+      self.stop()
+
+  def isObsolete(self):
+    '''
+    @return True if the result of the running request will not be shown since a newer request is waiting.
+    '''
+    return self.pending != None
+
+  def startRequest(self, start, cancel, submitTime):
+    self.running = (cancel, submitTime)
+    start()
+
+  def finished(self):
+    if self.worker.isRunning():
+      # finished signal of a run that ended before the current request was started
+      return
+    if self.pending != None:
+      (start, cancel, submitTime) = self.pending
+      self.pending = None
+      self.startRequest(start, cancel, submitTime)
+      return
+    if self.running != None:
+      self.latencies.append(time.monotonic() - self.running[1])
+      self.running = None
+      logging.debug("Request latency: {:.1f} ms ({}).".format(1000.*self.latencies[-1], self.getStatistics()))
+
+  def getStatistics(self):
+    '''
+    @return String summarising the latencies of the latest requests.
+    '''
+    if len(self.latencies) == 0:
+      return "no requests"
+    values = sorted(self.latencies)
+    return "median {:.1f} ms, max {:.1f} ms of {} requests".format(
+      1000.*values[len(values)//2], 1000.*values[-1], len(values))
@@ -0,0 +1,212 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import concurrent.futures
+import fnmatch
+import logging
+from opcua import ua
+
+logger = logging.getLogger("UAclient")
+
+# errors of requests to the server: bad status codes, timeouts and connection problems
+RequestErrors = (ua.UaError, concurrent.futures.TimeoutError, OSError)
+
+class SubscriptionGroup():
+  '''
+  Settings of the subscriptions used for a group of PVs.
+  @param pattern(string): Shell-style pattern (see fnmatch) matched against the node identifier, e.g. *DAQ*.
+  @param publishingInterval(float): Publishing interval of the subscriptions in ms.
+  @param samplingInterval(float): Sampling interval of the monitored items in ms. 0 means as fast as possible,
+                                  -1 means the publishing interval.
+  @param queueSize(int): Server side queue size of the monitored items. Values of one node changing faster than
+                         the publishing interval are only delivered if the queue size is larger than 1.
+  '''
+  def __init__(self, pattern, publishingInterval = 500., samplingInterval = -1., queueSize = 0):
+    self.pattern = pattern
+    self.publishingInterval = publishingInterval
+    self.samplingInterval = samplingInterval
+    self.queueSize = queueSize
+    self.subscriptions = []
+
+  def matches(self, node):
+    return fnmatch.fnmatchcase(str(node.nodeid.Identifier), self.pattern)
+
+  def __str__(self):
+    return "{} (publishing interval: {} ms, sampling interval: {} ms, queue size: {})".format(
+      self.pattern, self.publishingInterval, self.samplingInterval, self.queueSize)
+
+class SubscriptionManager():
+  '''
+  Shares a few OPC UA subscriptions between all nodes shown by the GUI.
+  Every node belongs to the first group whose pattern matches the node identifier. The nodes of a group
+  are monitored by the subscriptions of the group, each holding at most maxItems monitored items.
+  The number of observers of each node is counted. A node is monitored as long as it has observers and
+  monitored items are created with one request per subscription for all given nodes. Only the public API
+  of python-opcua subscriptions is used.
+  @param client(opcua.Client): The connected client.
+  @param handler: The data change handler of all subscriptions (see DataChangeHandler).
+  @param groups(list): List of SubscriptionGroup. Nodes not matching any group use a default group.
+  @param maxItems(int): Maximum number of monitored items per subscription.
+  '''
+  def __init__(self, client, handler, groups = None, maxItems = 1000):
+    self.client = client
+    self.handler = handler
+    self.groups = list(groups) if groups != None else []
+    if len(self.groups) == 0 or self.groups[-1].pattern != "*":
+      self.groups.append(SubscriptionGroup("*"))
+    self.maxItems = maxItems
+    self.observers = {}     # node -> number of observers
+    self.items = {}         # node -> (subscription, monitored item id)
+    self.nItems = {}        # subscription -> number of monitored items
+    # last client handle assigned to a monitored item (see makeRequest). python-opcua counts the handles
+    # of subscribe_data_change up from a small number -> use the upper half of the UInt32 range
+    self.clientHandle = 2**31
+
+  def getGroup(self, node):
+    for group in self.groups:
+      if group.matches(node):
+        return group
+
+  def getSubscription(self, group):
+    '''
+    @return A subscription of the group with space for another monitored item. A new subscription is created if needed.
+    '''
+    for subscription in group.subscriptions:
+      if self.nItems[subscription] < self.maxItems:
+        return subscription
+    params = ua.CreateSubscriptionParameters()
+    params.RequestedPublishingInterval = group.publishingInterval
+    params.RequestedLifetimeCount = 10000
+    params.RequestedMaxKeepAliveCount = 3000
+    params.MaxNotificationsPerPublish = 10000
+    params.PublishingEnabled = True
+    params.Priority = 0
+    subscription = self.client.create_subscription(params, self.handler)
+    logger.debug("Created subscription for group {}".format(group))
+    group.subscriptions.append(subscription)
+    self.nItems[subscription] = 0
+    return subscription
+
+  def makeRequest(self, group, node):
+    '''
+    @return The MonitoredItemCreateRequest for a node with the settings of its group.
+    '''
+    itemToMonitor = ua.ReadValueId()
+    itemToMonitor.NodeId = node.nodeid
+    itemToMonitor.AttributeId = ua.AttributeIds.Value
+    parameters = ua.MonitoringParameters()
+    # client handles are assigned here, since only create_monitored_items is used for the subscriptions
+    self.clientHandle = self.clientHandle + 1
+    parameters.ClientHandle = self.clientHandle
+    parameters.SamplingInterval = group.samplingInterval
+    parameters.QueueSize = group.queueSize
+    parameters.DiscardOldest = True
+    request = ua.MonitoredItemCreateRequest()
+    request.ItemToMonitor = itemToMonitor
+    request.MonitoringMode = ua.MonitoringMode.Reporting
+    request.RequestedParameters = parameters
+    return request
+
+  def subscribe(self, nodes):
+    '''
+    Add an observer to each of the given nodes. Nodes without observers so far are monitored.
+    @param nodes(list): The nodes. A node can be given several times to add several observers.
+    @return List of nodes that could not be monitored, e.g. because they do not exist. The observers
+            added by this call are removed again for them.
+    '''
+    added = {}              # node -> number of observers added by this call
+    requests = {}           # subscription -> list of (node, monitored item request)
+    failed = []
+    for node in nodes:
+      added[node] = added.get(node, 0) + 1
+      if node in self.observers:
+        self.observers[node] = self.observers[node] + 1
+        continue
+      self.observers[node] = 1
+      group = self.getGroup(node)
+      try:
+        subscription = self.getSubscription(group)
+      except RequestErrors as e:
+        logger.warning("Failed to create subscription for group {}: {}".format(group, e))
+        failed.append(node)
+        continue
+      requests.setdefault(subscription, []).append((node, self.makeRequest(group, node)))
+      # reserve the item, so the subscription is not overfilled by this call
+      self.nItems[subscription] = self.nItems[subscription] + 1
+    for (subscription, entries) in requests.items():
+      try:
+        results = subscription.create_monitored_items([request for (node, request) in entries])
+      except RequestErrors as e:
+        logger.warning("Failed to create monitored items: {}".format(e))
+        results = [ua.StatusCode(ua.StatusCodes.BadUnexpectedError)]*len(entries)
+      for ((node, request), result) in zip(entries, results):
+        if isinstance(result, ua.StatusCode):
+          logger.debug("Failed to monitor node {}: {}".format(node.nodeid.Identifier, result.name))
+          self.nItems[subscription] = self.nItems[subscription] - 1
+          failed.append(node)
+        else:
+          self.items[node] = (subscription, result)
+    # remove the observers added for the failed nodes
+    for node in failed:
+      self.observers[node] = self.observers[node] - added[node]
+      if self.observers[node] <= 0:
+        del self.observers[node]
+    return failed
+
+  def unsubscribe(self, nodes):
+    '''
+    Remove an observer from each of the given nodes. Nodes without observers are not monitored anymore.
+    @param nodes(list): The nodes. A node can be given several times to remove several observers.
+    @return List of nodes that are not monitored anymore.
+    '''
+    removed = []
+    handles = {}            # subscription -> list of monitored item ids
+    for node in nodes:
+      if not node in self.observers:
+        logger.error("Tried to unsubscribe node that was not subscribed: " + str(node.nodeid.Identifier))
+        continue
+      self.observers[node] = self.observers[node] - 1
+      if self.observers[node] > 0:
+        continue
+      del self.observers[node]
+      (subscription, handle) = self.items.pop(node)
+      handles.setdefault(subscription, []).append(handle)
+      removed.append(node)
+    for (subscription, ids) in handles.items():
+      self.deleteMonitoredItems(subscription, ids)
+    return removed
+
+  def deleteMonitoredItems(self, subscription, ids):
+    '''
+    Delete several monitored items of a subscription.
+    Subscription.unsubscribe only cleans up the item of a single handle, so it is called for each item.
+    '''
+    self.nItems[subscription] = self.nItems[subscription] - len(ids)
+    for handle in ids:
+      try:
+        subscription.unsubscribe(handle)
+      except RequestErrors as e:
+        logger.warning("Failed to delete monitored item: {}".format(e))
+
+  def getObservers(self, node):
+    return self.observers.get(node, 0)
+
+  def clear(self):
+    '''
+    Delete all subscriptions.
+    '''
+    for group in self.groups:
+      for subscription in group.subscriptions:
+        try:
+          subscription.delete()
+        except RequestErrors as e:
+          logger.warning("Failed to delete subscription: {}".format(e))
+      group.subscriptions = []
+    self.observers.clear()
+    self.items.clear()
+    self.nItems.clear()
+
+  def __contains__(self, node):
+    return node in self.observers
+
+  def __len__(self):
+    return len(self.observers)
@@ -0,0 +1,199 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import hashlib
+import logging
+import threading
+import numpy as np
+from chimeratk_daq.EventIndex import EventIndex
+from chimeratk_daq.HDF5Extractor import readItems
+
+FIELDS = ("bucket", "count", "min", "max", "sum", "sumSq")
+
+def summarize(t, y, resolution):
+  '''
+  Calculate the summary of a series for fixed time buckets.
+  @param t(numpy.ndarray): Time stamps in seconds since EPOCH.
+  @param y(numpy.ndarray): The values. nan values are ignored.
+  @param resolution(float): Bucket width in seconds.
+  @return Dictionary of arrays with one entry per bucket: bucket (bucket number, i.e. t/resolution),
+          count, min, max, sum and sumSq (sum of squares).
+  '''
+  valid = ~(np.isnan(t) | np.isnan(y))
+  return merge(np.floor(t[valid]/resolution).astype(np.int64), np.ones(np.count_nonzero(valid), dtype=np.int64),
+               y[valid], y[valid], y[valid], y[valid]**2)
+
+def merge(bucket, count, ymin, ymax, ysum, sumSq):
+  '''
+  Combine summary entries that belong to the same bucket.
+  @return Dictionary of arrays sorted by bucket (see summarize).
+  '''
+  (buckets, inverse) = np.unique(bucket, return_inverse=True)
+  result = {"bucket": buckets,
+            "count": np.bincount(inverse, count, minlength=len(buckets)).astype(np.int64),
+            "min": np.full(len(buckets), np.inf),
+            "max": np.full(len(buckets), -np.inf),
+            "sum": np.bincount(inverse, ysum, minlength=len(buckets)),
+            "sumSq": np.bincount(inverse, sumSq, minlength=len(buckets))}
+  np.minimum.at(result["min"], inverse, ymin)
+  np.maximum.at(result["max"], inverse, ymax)
+  return result
+
+class SummaryStore():
+  '''
+  Store of precomputed summaries of DAQ variables used for overview plots of long histories.
+  For every file, variable and array position the events are summarised in fixed time buckets at
+  several resolutions (count, min, max, sum and sum of squares per bucket). The summaries are
+  stored next to the DAQ files in the directory .uDAQ_summary and are only valid as long as the
+  DAQ file is not changed. If the directory is not writable the summaries are only kept in memory.
+  @param resolutions(tuple): Bucket widths in seconds.
+  '''
+  directoryName = ".uDAQ_summary"
+
+  def __init__(self, resolutions = (10., 100., 1000., 10000., 100000.)):
+    self.resolutions = resolutions
+    self.entries = {}       # (file name, item, arrayPos) -> dict(status, summaries per resolution)
+    self.lock = threading.Lock()
+
+  def getStoreFile(self, filename, item, arrayPos):
+    path = os.path.join(os.path.dirname(os.path.abspath(filename)), SummaryStore.directoryName)
+    itemHash = hashlib.md5(item.encode()).hexdigest()[:16]
+    return os.path.join(path, "{}.{}.{}.npz".format(os.path.basename(filename), itemHash, arrayPos))
+
+  def load(self, filename, item, arrayPos):
+    '''
+    @return The summary entry of the given file or None if it does not exist or is outdated.
+    '''
+    key = (filename, item, arrayPos)
+    with self.lock:
+      entry = self.entries.get(key)
+    try:
+      status = EventIndex.fileStatus(filename)
+    except OSError:
+      return None
+    if entry != None and entry["status"] == status:
+      return entry
+    try:
+      with np.load(self.getStoreFile(filename, item, arrayPos)) as content:
+        if tuple(content["status"]) != status or tuple(content["resolutions"]) != tuple(self.resolutions):
+          return None
+        entry = {"status": status,
+                 "summaries": [{field: content["{}_{}".format(field, i)] for field in FIELDS}
+                               for i in range(len(self.resolutions))]}
+    except FileNotFoundError:
+      return None
+    except (OSError, ValueError, KeyError) as e:
+      logging.warning("Failed to read summary of {} for file {}: {}".format(item, filename, e))
+      return None
+    with self.lock:
+      self.entries[key] = entry
+    return entry
+
+  def contains(self, filename, item, arrayPos):
+    return self.load(filename, item, arrayPos) != None
+
+  def add(self, filename, item, arrayPos, t, y):
+    '''
+    Summarise the events of one file and store the result.
+    @param filename(string): The DAQ file.
+    @param t(numpy.ndarray): The time stamps of all events of the file.
+    @param y(numpy.ndarray): One value per event.
+    '''
+    entry = {"status": EventIndex.fileStatus(filename),
+             "summaries": [summarize(t, y, resolution) for resolution in self.resolutions]}
+    with self.lock:
+      self.entries[(filename, item, arrayPos)] = entry
+    storeFile = self.getStoreFile(filename, item, arrayPos)
+    content = {"status": np.array(entry["status"]), "resolutions": np.array(self.resolutions)}
+    for (i, summary) in enumerate(entry["summaries"]):
+      for field in FIELDS:
+        content["{}_{}".format(field, i)] = summary[field]
+    tmpFile = storeFile + ".tmp.npz"
+    try:
+      os.makedirs(os.path.dirname(storeFile), exist_ok=True)
+      np.savez(tmpFile, **content)
+      os.replace(tmpFile, storeFile)
+    except OSError as e:
+      logging.warning("Failed to write summary {}: {}".format(storeFile, e))
+
+  def getTimeLine(self, filenames, item, arrayPos, tStart, tEnd, maxPoints):
+    '''
+    Get a time line from the summaries of the given files.
+    The finest resolution that results in at most maxPoints buckets is used.
+    @param filenames(list): The DAQ files covering the time range.
+    @param tStart(float): Start of the time range in seconds since EPOCH.
+    @param tEnd(float): End of the time range in seconds since EPOCH.
+    @return Dictionary holding the arrays x (bucket centres), y (mean), min, max, std and count and the
+            bucket width (resolution) or None if the summary of one of the files is not available.
+    '''
+    entries = [self.load(filename, item, arrayPos) for filename in filenames]
+    if any(entry == None for entry in entries):
+      return None
+    level = len(self.resolutions) - 1
+    for (i, resolution) in enumerate(self.resolutions):
+      if (tEnd - tStart)/resolution <= maxPoints:
+        level = i
+        break
+    resolution = self.resolutions[level]
+    summary = merge(*[np.concatenate([entry["summaries"][level][field] for entry in entries]) for field in FIELDS])
+    selected = (summary["bucket"] >= np.floor(tStart/resolution)) & (summary["bucket"] <= np.floor(tEnd/resolution))
+    count = summary["count"][selected]
+    mean = summary["sum"][selected]/count
+    return {"x": (summary["bucket"][selected] + 0.5)*resolution,
+            "y": mean,
+            "min": summary["min"][selected],
+            "max": summary["max"][selected],
+            "std": np.sqrt(np.maximum(summary["sumSq"][selected]/count - mean**2, 0)),
+            "count": count,
+            "resolution": resolution}
+
+class SummaryBuilder():
+  '''
+  Background job that fills the SummaryStore for requested variables.
+  The files are processed one by one in a separate thread. Each file is read holding the request lock of the
+  worker, so the builder does not read while the worker processes a request.
+  @param worker(chimeratk_daq.HDF5Worker.worker): The worker providing the files and events.
+  @param store(SummaryStore): The store to be filled.
+  '''
+  def __init__(self, worker, store):
+    self.worker = worker
+    self.store = store
+    self.pending = []       # list of (item, arrayPos) to be summarised
+    self.active = False
+    self.lock = threading.Lock()
+
+  def request(self, items, arrayPos):
+    '''
+    Request summaries for the given items. Already existing summaries are not recalculated.
+    '''
+    with self.lock:
+      for item in items:
+        if not (item, arrayPos) in self.pending:
+          self.pending.append((item, arrayPos))
+      if not self.active and len(self.pending) > 0:
+        self.active = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+  def run(self):
+    while True:
+      with self.lock:
+        if len(self.pending) == 0:
+          self.active = False
+          return
+        (item, arrayPos) = self.pending.pop(0)
+      logging.debug("Building summary for {} (array position {}).".format(item, arrayPos))
+      for (fileIndex, filename) in enumerate(self.worker.filenames):
+        if self.store.contains(filename, item, arrayPos):
+          continue
+        events = np.flatnonzero(self.worker.fileIndices == fileIndex)
+        groups = [self.worker.eventList[event][1] for event in events]
+        try:
+          # files are read while no request is processed by the worker, a request waits for at most one file
+          with self.worker.requestLock:
+            with self.worker.getFile(fileIndex) as theFile:
+              (result, nBytes) = readItems(theFile, groups, [item], arrayPos, clamped = set())
+          y = result[item]
+          self.store.add(filename, item, arrayPos, self.worker.timeStamps[events], y)
+        except (OSError, KeyError, ValueError) as e:
+          logging.warning("Failed to build summary of {} for file {}: {}".format(item, filename, e))
+      logging.debug("Summary for {} done.".format(item))
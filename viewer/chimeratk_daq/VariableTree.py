@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: Helmholtz-Zentrum Dresden-Rossendorf, FWKE, ChimeraTK Project <chimeratk-support@desy.de>
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+from PyQt5 import QtGui
+from PyQt5 import QtCore
+from PyQt5 import QtWidgets
+
+SCALAR_COLOR = "#0a3cba" # blue
+ARRAY_COLOR = "#48ba0b"  # green
+
+class VariableTree():
+  '''
+  Lazily populated variable tree.
+  Only the top level items are created initially. The children of a group are created when the
+  group is expanded. The variables are taken from a schema (see EventIndex.getSchema), so the
+  HDF5 file is not accessed while browsing the tree.
+  The data of each item (Qt.UserRole) is the variable path, e.g. /Probe/amp. Scalars are shown blue,
+  arrays green.
+  @param treeWidget(QTreeWidget): The tree widget to be filled.
+  @param schema(dict): Variable paths relative to the event to pairs of shape and type.
+  @param maxFilterResults(int): If more variables match a filter their groups are not expanded.
+  '''
+  def __init__(self, treeWidget, schema, maxFilterResults = 500):
+    self.treeWidget = treeWidget
+    self.schema = schema
+    self.maxFilterResults = maxFilterResults
+    self.children = {}      # group path -> sorted list of child paths
+    self.items = {}         # path -> QTreeWidgetItem of created items
+    self.populated = set()  # groups whose children are created
+    self.visible = None     # paths shown by the current filter, None if no filter is set (see setFilter)
+    self.paths = sorted("/" + name for name in schema)
+    for path in self.paths:
+      (parent, name) = path.rsplit("/", 1)
+      while True:
+        siblings = self.children.setdefault(parent, set())
+        if path in siblings:
+          break
+        siblings.add(path)
+        if parent == "":
+          break
+        (path, parent) = (parent, parent.rsplit("/", 1)[0])
+    self.children = {group: sorted(paths) for (group, paths) in self.children.items()}
+    self.treeWidget.itemExpanded.connect(self.expanded)
+    self.populate("")
+    logging.debug("Variable tree with {} variables and {} groups.".format(len(self.paths), len(self.children)))
+
+  def isGroup(self, path):
+    return path in self.children
+
+  def populate(self, group):
+    '''
+    Create the items of the children of the given group. The current filter is applied to the new items.
+    @param group(string): The group path, "" for the top level.
+    '''
+    if group in self.populated:
+      return
+    self.populated.add(group)
+    parent = self.items[group] if group != "" else self.treeWidget
+    for path in self.children.get(group, []):
+      entry = QtWidgets.QTreeWidgetItem(parent)
+      entry.setText(0, path.rsplit("/", 1)[1])
+      entry.setData(0, QtCore.Qt.UserRole, path)
+      if self.isGroup(path):
+        entry.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+      else:
+        (shape, dtype) = self.schema[path[1:]]
+        if len(shape) == 0 or shape[0] == 1:
+          entry.setForeground(0,QtGui.QBrush(QtGui.QColor(SCALAR_COLOR)))
+        else:
+          entry.setForeground(0,QtGui.QBrush(QtGui.QColor(ARRAY_COLOR)))
+        entry.setToolTip(0, "{} {}".format(dtype, tuple(shape)))
+      if self.visible != None:
+        entry.setHidden(not path in self.visible)
+      self.items[path] = entry
+
+  def expanded(self, item):
+    self.populate(str(item.data(0, QtCore.Qt.UserRole)))
+
+  def setFilter(self, text):
+    '''
+    Show only variables containing the given text (case insensitive) and the groups leading to them.
+    Groups of matching variables are expanded if there are not more than maxFilterResults matches.
+    @param text(string): The filter text. An empty text shows all variables.
+    '''
+    text = text.strip().lower()
+    if text == "":
+      self.visible = None
+      for item in self.items.values():
+        item.setHidden(False)
+      return
+    matches = [path for path in self.paths if text in path.lower()]
+    visible = set()
+    for path in matches:
+      while path != "" and not path in visible:
+        visible.add(path)
+        path = path.rsplit("/", 1)[0]
+    self.visible = visible
+    expand = len(matches) <= self.maxFilterResults
+    if expand:
+      for group in sorted(group for group in visible if self.isGroup(group)):
+        self.populate(group)
+    self.treeWidget.setUpdatesEnabled(False)
+    for (path, item) in self.items.items():
+      item.setHidden(not path in visible)
+      if expand and path in visible and self.isGroup(path):
+        item.setExpanded(True)
+    self.treeWidget.setUpdatesEnabled(True)